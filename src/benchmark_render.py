@@ -0,0 +1,56 @@
+import os
+import shutil
+import sys
+import time
+
+from prettytable import PrettyTable
+
+from src.classes.job import Job
+from src.utils.config import get_generators
+from src.utils.status import error, info
+from src.utils.video_generator import generate_video
+
+BACKENDS = ["moviepy", "ffmpeg"]
+
+
+def main(job_dir: str) -> None:
+    """
+    Renders the artifacts of a job with every render backend and reports their render time.
+
+    Args:
+        job_dir (str): The folder of a job whose images, audio and subtitles stages are completed.
+
+    Returns:
+        None
+    """
+    job = Job.load(job_dir)
+    if job is None or not all(job.has(stage) for stage in ("images", "audio", "subtitles")):
+        error(f"No completed images, audio and subtitles in \"{job_dir}\".")
+        return
+
+    config = next(generator for generator in get_generators() if generator.id == job.generator_id)
+
+    table = PrettyTable(["Backend", "Render time (s)", "Size (MB)"])
+    for backend in BACKENDS:
+        info(f"Rendering with the {backend} backend...")
+
+        # Equalizing rewrites the subtitles file, every backend starts from the same one
+        subtitles_path = job.path(f"benchmark_{backend}.srt")
+        shutil.copy(job.get("subtitles"), subtitles_path)
+        output_path = job.path(f"benchmark_{backend}.mp4")
+
+        start = time.perf_counter()
+        generate_video(job.get("images"), job.get("audio"), subtitles_path, config.font, config.subtitles_max_chars,
+                       config.subtitles_font_size, config.subtitles_font_color, config.subtitles_font_outline_color,
+                       config.subtitles_font_outline_thickness, config.audio_song_volume, output_path, backend)
+        table.add_row([backend, f"{time.perf_counter() - start:.1f}", f"{os.path.getsize(output_path) / 1e6:.1f}"])
+
+    print(table)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        error("Usage: python benchmark_render.py <job folder>")
+        sys.exit(1)
+
+    main(sys.argv[1])
@@ -4,36 +4,57 @@ import re
 from typing import List
 from uuid import uuid4
 
-from classes.video import Video, load_videos_from_json, save_videos_to_json
-from src.utils.config import ROOT_DIR, get_verbose
+from classes.video import Video, get_video_repository
+from src.classes.job import Job
+from src.classes.task_graph import TaskGraph
+from src.utils.browser_pool import get_browser_pool
+from src.utils.config import ROOT_DIR, GeneratorConfig, get_settings, get_verbose
+from src.utils.metrics import timed, timed_stage
+from src.utils.resources import resource
 from src.utils.constants import parse_model, build_generate_topic_prompt, build_generate_script_prompt, \
     build_generate_title_prompt, build_generate_description_prompt, build_generate_image_prompts, \
     build_is_topic_already_covered_prompt
 from src.utils.status import info, error, success
-from src.utils.tts import TTS
+from src.utils.subtitles import write_subtitles
+from src.utils.tts import get_tts, synthesize_parallel
+from src.utils.utils import store_for_upload
 from src.utils.video_generator import generate_subtitles, generate_video
-from src.utils.web_browser import init_browser, upload_video
-from utils.image_generator import generate_image
+from src.utils.web_browser import upload_video
+from utils.image_generator import generate_images
 from utils.llm import generate_response
 
 
-def generate_script_to_speech(script) -> str:
+def generate_script_to_speech(script, path: str = None, srt_path: str = None) -> str:
     """
     Converts the generated script into Speech using CoquiTTS and returns the path to the wav file.
 
     Args:
         script (str): The script to convert to speech.
+        path (str, optional): The path of the wav file, a new file in `temp` if omitted.
+        srt_path (str, optional): If set, subtitles timed on the synthesized sentences are written to this path.
 
     Returns:
         path_to_wav (str): Path to generated audio (WAV Format).
     """
-    path = os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".wav")
+    if path is None:
+        path = os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".wav")
 
     # Clean script, remove every character that is not a word character,
     # a space, a period, a question mark, or an exclamation mark.
     script = re.sub(r'[^\w\s.?!]', '', script)
 
-    TTS().synthesize(script, path)
+    if get_settings().tts_workers > 1:
+        timings = synthesize_parallel(script, path)
+    elif srt_path is None:
+        timings = None
+        get_tts().synthesize(script, path)
+    else:
+        timings = get_tts().synthesize_sentences(script, path)
+
+    if srt_path is not None:
+        write_subtitles(timings, srt_path)
+        if get_verbose():
+            info(f" => Wrote subtitles to \"{srt_path}\"")
 
     if get_verbose():
         info(f" => Wrote TTS to \"{path}\"")
@@ -41,84 +62,200 @@ def generate_script_to_speech(script) -> str:
     return path
 
 
+def parse_image_prompts(completion: str) -> List[str]:
+    """
+    Extracts the image prompts from the JSON list of a LLM completion.
+
+    Args:
+        completion (str): The completion of the image prompts prompt.
+
+    Returns:
+        image_prompts (List[str]): The image prompts, raises if the completion holds no JSON list.
+    """
+    completion = str(completion) \
+        .replace("```json", "") \
+        .replace("```", "")
+
+    completion = completion[completion.find("["):]
+    completion = completion[:completion.find("]") + 1]
+
+    if "image_prompts" in completion:
+        image_prompts = json.loads(completion)["image_prompts"]
+    else:
+        image_prompts = json.loads(completion)
+
+    if not isinstance(image_prompts, list):
+        raise ValueError("The image prompts are not a list.")
+
+    return image_prompts
+
+
 class Generator:
-    def __init__(self, config: dict) -> None:
-        self.id = config["id"]
-        self.language = config["language"]
-        self.subject = config["subject"]
-        self.llm = config["llm"]
-        self.image_prompt_llm = config["image_prompt_llm"]
-        self.image_model = config["image_model"]
-        self.is_for_kids = config["is_for_kids"]
-        self.font = config["font"]
-        self.firefox_profile = config["firefox_profile"]
-        self.subtitles_max_chars = config["subtitles_max_chars"]
-        self.subtitles_font_size = config["subtitles_font_size"]
-        self.subtitles_font_color = config["subtitles_font_color"]
-        self.subtitles_font_outline_color = config["subtitles_font_outline_color"]
-        self.subtitles_font_outline_thickness = config["subtitles_font_outline_thickness"]
-        self.audio_song_volume = config["audio_song_volume"]
-        self.images_count = config["images_count"]
+    def __init__(self, config: GeneratorConfig) -> None:
+        self.config = config
+        self.id = config.id
+        self.language = config.language
+        self.subject = config.subject
+        self.llm = config.llm
+        self.image_prompt_llm = config.image_prompt_llm
+        self.image_model = config.image_model
+        self.is_for_kids = config.is_for_kids
+        self.font = config.font
+        self.firefox_profile = config.firefox_profile
+        self.subtitles_max_chars = config.subtitles_max_chars
+        self.subtitles_font_size = config.subtitles_font_size
+        self.subtitles_font_color = config.subtitles_font_color
+        self.subtitles_font_outline_color = config.subtitles_font_outline_color
+        self.subtitles_font_outline_thickness = config.subtitles_font_outline_thickness
+        self.audio_song_volume = config.audio_song_volume
+        self.images_count = config.images_count
 
         if get_verbose():
             success(f"Initialized Generator with ID: {self.id}")
 
-    def generate_video(self):
-        done = False
-        while not done:
-            try:
-                already_covered = True
-                topic = ""
-                while already_covered:
-                    if get_verbose():
-                        info(f"Generating Video for Subject: {self.subject}")
-                    topic = self.generate_topic(self.subject)
-
-                    if get_verbose():
-                        info(f"Check if the subject '{topic}' has already been covered.")
-                    already_covered = self.already_covered(topic)
-                    if already_covered and get_verbose():
-                        info(f"The subject has already been covered. Generating a new topic.")
-
-                if get_verbose():
-                    info(f"Generated Topic: {topic}")
-                script = self.generate_script(topic, self.language)
-                if get_verbose():
-                    info(f"Generated Script: {script}")
-                metadata = self.generate_metadata(topic, script, self.language)
-                if get_verbose():
-                    info(f"Generated Metadata: {metadata}")
-                image_prompts = self.generate_image_prompts(script, topic, self.images_count)
-                if get_verbose():
-                    info(f"Generated Image Prompts: {image_prompts}")
-
-                images_files = []
-                for prompt in image_prompts:
-                    image = generate_image(prompt, self.image_model, os.path.join(ROOT_DIR, "temp"))
-                    images_files.append(image)
-                    if get_verbose():
-                        info(f"Generated Image: {image} for prompt: {prompt}")
-
-                audio_file = generate_script_to_speech(script)
-                srt_file = generate_subtitles(audio_file)
-
-                video_file = generate_video(images_files, audio_file, srt_file, self.font, self.subtitles_max_chars,
-                                            self.subtitles_font_size, self.subtitles_font_color,
-                                            self.subtitles_font_outline_color, self.subtitles_font_outline_thickness,
-                                            self.audio_song_volume)
+    def generate_video(self, attempts: int = 1) -> dict:
+        """
+        Generates a video, resuming the stages completed by a previous attempt.
 
+        Args:
+            attempts (int): The amount of attempts before the error of the last one is raised.
+
+        Returns:
+            metadata (dict): The metadata of the generated video.
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                # Resume the stages completed by a previous attempt, even from a previous run
+                job = Job.resume_or_create(self.id)
+                results = self.build_task_graph(job).run()
+
+                video_file = results["video"]
+                script = results["script"]
+                topic = results["topic"]
+                metadata = {
+                    "title": results["title"],
+                    "description": results["description"]
+                }
+
+                # Keep the video once the job folder is removed, until it is uploaded
+                video_file = store_for_upload(video_file, job.id)
                 success(f"Generated Video: {video_file}")
                 metadata["video_path"] = video_file
 
-                video = Video(metadata["title"], metadata["description"], self.subject, script, self.language, video_file)
-                videos = load_videos_from_json()
-                videos.append(video)
-                save_videos_to_json(videos)
+                video = Video(metadata["title"], metadata["description"], self.subject, script, self.language, video_file,
+                              generator_id=self.id, topic=topic)
+                metadata["video_id"] = get_video_repository().add(video)
+                metadata["generator_id"] = self.id
+                job.finish()
 
                 return metadata
             except Exception as e:
-                error(f"Error occurred while generating video: {str(e)}")
-                done = False
+                error(f"Error occurred while generating video (attempt {attempt}/{attempts}): {str(e)}")
+                if attempt == attempts:
+                    raise
+
+    def build_task_graph(self, job: Job) -> TaskGraph:
+        """
+        Declares the steps of the video generation and the steps each one depends on.
+        Every step is checkpointed in the job, its artifacts are written to the job folder.
+
+        Args:
+            job (Job): The job holding the artifacts of the video.
+
+        Returns:
+            graph (TaskGraph): The generation steps, the `video` task holds the path to the final video.
+        """
+        verbose = get_verbose()
+
+        def topic() -> str:
+            already_covered = True
+            new_topic = ""
+            while already_covered:
+                if verbose:
+                    info(f"Generating Video for Subject: {self.subject}")
+                new_topic = self.generate_topic(self.subject)
+
+                if verbose:
+                    info(f"Check if the subject '{new_topic}' has already been covered.")
+                already_covered = self.already_covered(new_topic)
+                if already_covered and verbose:
+                    info(f"The subject has already been covered. Generating a new topic.")
+
+            if verbose:
+                info(f"Generated Topic: {new_topic}")
+            return new_topic
+
+        def script(topic: str) -> str:
+            generated = self.generate_script(topic, self.language)
+            if verbose:
+                info(f"Generated Script: {generated}")
+            return generated
+
+        def title(topic: str) -> str:
+            generated = self.generate_title(topic, self.language)
+            if verbose:
+                info(f"Generated Title: {generated}")
+            return generated
+
+        def description(script: str) -> str:
+            generated = self.generate_description(script, self.language)
+            if verbose:
+                info(f"Generated Description: {generated}")
+            return generated
+
+        def image_prompts(topic: str, script: str) -> List[str]:
+            generated = self.generate_image_prompts(script, topic, self.images_count)
+            if verbose:
+                info(f"Generated Image Prompts: {generated}")
+            return generated
+
+        def images(image_prompts: List[str]) -> List[str]:
+            images_files = generate_images(image_prompts, self.image_model, job.directory,
+                                          fallbacks=self.config.image_fallbacks)
+            if verbose:
+                for image, prompt in zip(images_files, image_prompts):
+                    info(f"Generated Image: {image} for prompt: {prompt}")
+            return images_files
+
+        local_subtitles = self.config.subtitles_backend == "local"
+
+        def audio(script: str) -> str:
+            if local_subtitles:
+                # The subtitles are timed during the synthesis
+                return generate_script_to_speech(script, job.path("audio.wav"), job.path("subtitles.srt"))
+            return generate_script_to_speech(script, job.path("audio.wav"))
+
+        def subtitles(audio: str) -> str:
+            if local_subtitles:
+                return job.path("subtitles.srt")
+            return generate_subtitles(audio, job.path("subtitles.srt"))
+
+        def video(images: List[str], audio: str, subtitles: str) -> str:
+            return generate_video(images, audio, subtitles, self.font, self.subtitles_max_chars,
+                                  self.subtitles_font_size, self.subtitles_font_color,
+                                  self.subtitles_font_outline_color, self.subtitles_font_outline_thickness,
+                                  self.audio_song_volume, job.path("video.mp4"), self.config.render_backend,
+                                  self.config.render_chunks)
+
+        single_file = lambda path: [path]
+
+        def stage(name, func, files=None):
+            # Timed only when it actually runs, not when reused from the job
+            return job.checkpointed(name, timed_stage(name, func), files)
+
+        graph = TaskGraph()
+        graph.add("topic", stage("topic", topic))
+        graph.add("script", stage("script", script), ["topic"])
+        graph.add("title", stage("title", title), ["topic"])
+        graph.add("description", stage("description", description), ["script"])
+        graph.add("image_prompts", stage("image_prompts", image_prompts), ["topic", "script"])
+        graph.add("images", stage("images", images, list), ["image_prompts"])
+        audio_files = (lambda path: [path, job.path("subtitles.srt")]) if local_subtitles else single_file
+        graph.add("audio", stage("audio", audio, audio_files), ["script"])
+        graph.add("subtitles", stage("subtitles", subtitles, single_file), ["audio"])
+        graph.add("video", stage("video", video, single_file), ["images", "audio", "subtitles"])
+
+        return graph
 
     def generate_topic(self, subject) -> str:
         """
@@ -130,7 +267,8 @@ class Generator:
         Returns:
             topic (str): The generated topic.
         """
-        completion = generate_response(build_generate_topic_prompt(subject), parse_model(self.llm))
+        # A cached topic would be rejected as already covered, always ask for a new one
+        completion = generate_response(build_generate_topic_prompt(subject), parse_model(self.llm), use_cache=False)
 
         completion = completion.replace('"', '')
 
@@ -141,18 +279,31 @@ class Generator:
 
     def already_covered(self, subject) -> bool:
         """
-        Generates a topic based on the YouTube Channel niche.
+        Checks if a topic looks like the topic of an already generated video, using a local similarity index.
+        The LLM only decides the borderline cases, from the closest topics.
 
         Args:
-            subject (str): The subject of the video.
+            subject (str): The topic to check.
 
         Returns:
-            topic (str): The generated topic.
+            covered (bool): True if the topic has already been covered.
         """
-        videos = load_videos_from_json()
+        matches = get_video_repository().topic_index(self.subject).nearest(subject, k=10)
+        if not matches:
+            return False
+
+        score, closest = matches[0]
+        if get_verbose():
+            info(f" => Closest covered topic ({score:.2f}): {closest}")
+
+        if score >= self.config.topic_similarity_threshold:
+            return True
+        if score < self.config.topic_similarity_threshold - self.config.topic_similarity_margin:
+            return False
+
         subjects = ""
-        for video in videos:
-            subjects += video.subject + " ; "
+        for _, topic in matches:
+            subjects += topic + " ; "
 
         completion = generate_response(build_is_topic_already_covered_prompt(subjects, subject), parse_model(self.llm))
         if "YES" in completion.upper():
@@ -182,28 +333,33 @@ class Generator:
 
         return completion
 
-    def generate_metadata(self, subject, script, language) -> dict:
+    def generate_title(self, subject, language) -> str:
         """
-        Generates Video metadata for the to-be-uploaded YouTube Short (Title, Description).
+        Generates the title of the to-be-uploaded YouTube Short.
 
         Args:
             subject (str): The subject of the video.
-            script (str): The script of the video.
+            language (str): The language of the video.
 
         Returns:
-            metadata (dict): The generated metadata.
+            title (str): The generated title.
         """
-        title = generate_response(build_generate_title_prompt(subject, language), parse_model(self.llm))
-        description = generate_response(build_generate_description_prompt(script, language), parse_model(self.llm))
+        return generate_response(build_generate_title_prompt(subject, language), parse_model(self.llm))
 
-        description = description.replace('"', '')
+    def generate_description(self, script, language) -> str:
+        """
+        Generates the description of the to-be-uploaded YouTube Short.
+
+        Args:
+            script (str): The script of the video.
+            language (str): The language of the video.
 
-        metadata = {
-            "title": title,
-            "description": description
-        }
+        Returns:
+            description (str): The generated description.
+        """
+        description = generate_response(build_generate_description_prompt(script, language), parse_model(self.llm))
 
-        return metadata
+        return description.replace('"', '')
 
     def generate_image_prompts(self, script, subject, n_prompts) -> List[str]:
         """
@@ -220,21 +376,11 @@ class Generator:
 
         prompt = build_generate_image_prompts(script, subject, n_prompts)
 
-        completion = str(generate_response(prompt, parse_model(self.image_prompt_llm))) \
-            .replace("```json", "") \
-            .replace("```", "")
-
-        completion = completion[completion.find("["):]
-        completion = completion[:completion.find("]") + 1]
-
-        image_prompts = []
-
-        if "image_prompts" in completion:
-            image_prompts = json.loads(completion)["image_prompts"]
-        else:
-            image_prompts = json.loads(completion)
-            if get_verbose():
-                info(f" => Generated Image Prompts: {image_prompts}")
+        # A completion which is not a JSON list is not cached, a new one is generated
+        completion = generate_response(prompt, parse_model(self.image_prompt_llm), validate=parse_image_prompts)
+        image_prompts = parse_image_prompts(completion)
+        if get_verbose():
+            info(f" => Generated Image Prompts: {image_prompts}")
 
         return image_prompts
 
@@ -252,7 +398,7 @@ class Generator:
         """
         info("Uploading video to YouTube...")
         # close_running_selenium_instances()
-        browser = init_browser(self.firefox_profile)
-        url = upload_video(browser, video_path, title, description, self.is_for_kids)
+        with resource("browser"), timed("upload"), get_browser_pool().session(self.firefox_profile) as browser:
+            url = upload_video(browser, video_path, title, description, self.is_for_kids, self.firefox_profile)
         success(f"Uploaded Video: {url}")
         return url
@@ -0,0 +1,256 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable, List, Optional
+from uuid import uuid4
+
+from src.utils.config import ROOT_DIR, get_verbose
+from src.utils.status import info, warning
+
+JOBS_DIR = os.path.join(ROOT_DIR, "temp", "jobs")
+MANIFEST_FILE = "manifest.json"
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ABANDONED = "abandoned"
+
+
+class Job:
+    """
+    Working folder of one video generation, stored under `temp/jobs` with a manifest of the completed stages.
+    A failed or interrupted generation resumes from the last completed stage.
+    """
+
+    def __init__(self, directory: str, manifest: dict) -> None:
+        self._directory = directory
+        self._manifest = manifest
+        self._lock = threading.Lock()
+
+    @classmethod
+    def resume_or_create(cls, generator_id: int, max_attempts: int = 3) -> "Job":
+        """
+        Resumes the unfinished job of a generator, or creates a new one.
+        A job failing `max_attempts` times is abandoned, so that a bad topic or script gets regenerated.
+
+        Args:
+            generator_id (int): The ID of the generator.
+            max_attempts (int): The maximum amount of attempts of a job.
+
+        Returns:
+            job (Job): The resumed or created job.
+        """
+        for job in list_jobs():
+            if job.generator_id != generator_id or job.status != STATUS_RUNNING:
+                continue
+
+            if job.attempts >= max_attempts:
+                warning(f"Abandoning job {job.id} after {job.attempts} attempts.")
+                job.abandon()
+                continue
+
+            job._manifest["attempts"] += 1
+            job._save()
+            if get_verbose():
+                info(f"Resuming job {job.id}, completed stages: {', '.join(job._manifest['stages']) or 'none'}")
+            return job
+
+        job_id = f"{int(time.time())}-{generator_id}-{uuid4().hex[:8]}"
+        directory = os.path.join(JOBS_DIR, job_id)
+        os.makedirs(directory)
+
+        job = cls(directory, {
+            "id": job_id,
+            "generator_id": generator_id,
+            "status": STATUS_RUNNING,
+            "attempts": 1,
+            "created_at": time.time(),
+            "stages": {}
+        })
+        job._save()
+
+        return job
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["Job"]:
+        """
+        Loads a job from its folder.
+
+        Args:
+            directory (str): The folder of the job.
+
+        Returns:
+            job (Job): The job, None if its manifest is missing or unreadable.
+        """
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), "r") as file:
+                return cls(directory, json.load(file))
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def id(self) -> str:
+        return self._manifest["id"]
+
+    @property
+    def generator_id(self) -> int:
+        return self._manifest["generator_id"]
+
+    @property
+    def status(self) -> str:
+        return self._manifest["status"]
+
+    @property
+    def attempts(self) -> int:
+        return self._manifest["attempts"]
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def path(self, filename: str) -> str:
+        """
+        Builds the path of an artifact of the job.
+
+        Args:
+            filename (str): The file name of the artifact.
+
+        Returns:
+            path (str): The path of the artifact in the job folder.
+        """
+        return os.path.join(self._directory, filename)
+
+    def has(self, stage: str) -> bool:
+        """
+        Checks if a stage has been completed and its files are still present.
+
+        Args:
+            stage (str): The name of the stage.
+
+        Returns:
+            completed (bool): True if the stage can be skipped.
+        """
+        with self._lock:
+            record = self._manifest["stages"].get(stage)
+        return record is not None and all(os.path.exists(path) for path in record["files"])
+
+    def get(self, stage: str) -> Any:
+        """
+        Gets the result of a completed stage.
+
+        Args:
+            stage (str): The name of the stage.
+
+        Returns:
+            value (Any): The result of the stage.
+        """
+        with self._lock:
+            return self._manifest["stages"][stage]["value"]
+
+    def complete(self, stage: str, value: Any, files: Optional[List[str]] = None) -> None:
+        """
+        Records the result of a stage in the manifest.
+
+        Args:
+            stage (str): The name of the stage.
+            value (Any): The JSON serializable result of the stage.
+            files (List[str]): The files produced by the stage, the stage is replayed if one goes missing.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._manifest["stages"][stage] = {
+                "value": value,
+                "files": files or [],
+                "completed_at": time.time()
+            }
+        self._save()
+
+    def checkpointed(self, stage: str, func: Callable[..., Any],
+                     files: Optional[Callable[[Any], List[str]]] = None) -> Callable[..., Any]:
+        """
+        Wraps a stage so that it runs only if it was not completed by a previous attempt.
+
+        Args:
+            stage (str): The name of the stage.
+            func (Callable): The stage, called with keyword arguments.
+            files (Callable): Gets the files produced by the stage from its result.
+
+        Returns:
+            wrapped (Callable): The checkpointed stage.
+        """
+        def run(**kwargs) -> Any:
+            if self.has(stage):
+                if get_verbose():
+                    info(f"Reusing stage '{stage}' of job {self.id}")
+                return self.get(stage)
+
+            value = func(**kwargs)
+            self.complete(stage, value, files(value) if files else None)
+            return value
+
+        return run
+
+    def finish(self) -> None:
+        """
+        Marks the job as done and removes its folder, the video must have been moved out of it beforehand.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._manifest["status"] = STATUS_DONE
+        # Saved first, so a folder which fails to be removed is still cleaned up by `clean_jobs`
+        self._save()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def abandon(self) -> None:
+        """
+        Marks the job as abandoned, it won't be resumed anymore.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._manifest["status"] = STATUS_ABANDONED
+        self._save()
+
+    def _save(self) -> None:
+        with self._lock:
+            tmp_path = self.path(f"{MANIFEST_FILE}.{uuid4()}.tmp")
+            with open(tmp_path, "w") as file:
+                json.dump(self._manifest, file, indent=4)
+            os.replace(tmp_path, self.path(MANIFEST_FILE))
+
+
+def list_jobs() -> List[Job]:
+    """
+    Lists the jobs stored under `temp/jobs`, oldest first.
+
+    Returns:
+        jobs (List[Job]): The jobs.
+    """
+    if not os.path.exists(JOBS_DIR):
+        return []
+
+    jobs = []
+    for name in sorted(os.listdir(JOBS_DIR)):
+        job = Job.load(os.path.join(JOBS_DIR, name))
+        if job is not None:
+            jobs.append(job)
+
+    return jobs
+
+
+def clean_jobs() -> None:
+    """
+    Removes the folders of the finished and abandoned jobs, unfinished jobs are kept to be resumed.
+
+    Returns:
+        None
+    """
+    for job in list_jobs():
+        if job.status in (STATUS_DONE, STATUS_ABANDONED):
+            shutil.rmtree(job.directory, ignore_errors=True)
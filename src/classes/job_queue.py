@@ -0,0 +1,411 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from src.utils.config import ROOT_DIR
+from src.utils.status import error, info, success, warning
+
+QUEUE_DB_PATH = os.path.join(ROOT_DIR, "queue.db")
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class Deferred(Exception):
+    """
+    Raised by a job handler to postpone its job without counting an attempt.
+    """
+
+    def __init__(self, run_at: float, reason: str) -> None:
+        super().__init__(reason)
+        self.run_at = run_at
+
+
+class QueuedJob:
+    def __init__(self, id: int, kind: str, payload: dict, attempts: int, max_attempts: int):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+
+class JobQueue:
+    """
+    Persistent SQLite-backed job queue shared by the scheduler and the worker processes.
+
+    Jobs are delivered at least once: a worker holds a lease on the job it runs and renews it while running,
+    the job is handed to another worker if the lease expires because its worker crashed.
+    """
+
+    def __init__(self, db_path: str = QUEUE_DB_PATH) -> None:
+        """
+        Opens the queue, creating its schema if needed.
+
+        Args:
+            db_path (str): The path to the SQLite database.
+
+        Returns:
+            None
+        """
+        self._lock = threading.Lock()
+        # Autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                run_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (kind, status, run_at);
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status);
+            CREATE TABLE IF NOT EXISTS schedules (
+                name TEXT PRIMARY KEY,
+                next_run_at REAL NOT NULL
+            );
+        """)
+
+    def _transaction(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def enqueue(self, kind: str, payload: dict, run_at: Optional[float] = None, key: Optional[str] = None,
+                max_attempts: int = 3) -> Optional[int]:
+        """
+        Adds a job to the queue.
+
+        Args:
+            kind (str): The kind of the job, each worker handles one kind.
+            payload (dict): The JSON serializable arguments of the job.
+            run_at (float, optional): The earliest time the job may run, now if omitted.
+            key (str, optional): If set, the job is not added while a pending or running job has the same key.
+            max_attempts (int): The amount of attempts after which the job is marked as failed.
+
+        Returns:
+            id (int): The ID of the job, None if a job with the same key is already queued.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._transaction()
+            try:
+                if key is not None and self._connection.execute(
+                        "SELECT 1 FROM jobs WHERE key = ? AND status IN (?, ?)",
+                        (key, STATUS_PENDING, STATUS_RUNNING)).fetchone():
+                    self._connection.execute("COMMIT")
+                    return None
+
+                cursor = self._connection.execute(
+                    "INSERT INTO jobs (kind, key, payload, status, run_at, max_attempts, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, key, json.dumps(payload), STATUS_PENDING, run_at or now, max_attempts, now, now)
+                )
+                self._connection.execute("COMMIT")
+                return cursor.lastrowid
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def claim(self, kind: str, worker_id: str, lease_seconds: float) -> Optional[QueuedJob]:
+        """
+        Takes the next due job of a kind, or a running job whose worker lost its lease.
+
+        Args:
+            kind (str): The kind of job to take.
+            worker_id (str): The ID of the worker taking the job.
+            lease_seconds (float): The time after which the job is given to another worker unless renewed.
+
+        Returns:
+            job (QueuedJob): The claimed job, None if no job is due.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._transaction()
+            try:
+                while True:
+                    row = self._connection.execute(
+                        "SELECT id, payload, attempts, max_attempts, status FROM jobs WHERE kind = ? AND "
+                        "((status = ? AND run_at <= ?) OR (status = ? AND lease_until < ?)) ORDER BY run_at LIMIT 1",
+                        (kind, STATUS_PENDING, now, STATUS_RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        self._connection.execute("COMMIT")
+                        return None
+
+                    job_id, payload, attempts, max_attempts, status = row
+                    if status == STATUS_RUNNING and attempts >= max_attempts:
+                        # Its worker died during the last allowed attempt
+                        self._connection.execute(
+                            "UPDATE jobs SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                            (STATUS_FAILED, "Lease expired", now, job_id)
+                        )
+                        continue
+
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, lease_owner = ?, lease_until = ?, attempts = attempts + 1, "
+                        "updated_at = ? WHERE id = ?",
+                        (STATUS_RUNNING, worker_id, now + lease_seconds, now, job_id)
+                    )
+                    self._connection.execute("COMMIT")
+                    return QueuedJob(job_id, kind, json.loads(payload), attempts + 1, max_attempts)
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def renew_lease(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Extends the lease of a running job.
+
+        Args:
+            job_id (int): The ID of the job.
+            worker_id (str): The ID of the worker running the job.
+            lease_seconds (float): The new duration of the lease, from now.
+
+        Returns:
+            renewed (bool): False if the job has been taken over by another worker.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                (time.time() + lease_seconds, time.time(), job_id, worker_id, STATUS_RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        """
+        Marks a job as done.
+
+        Args:
+            job_id (int): The ID of the job.
+            worker_id (str): The ID of the worker running the job.
+
+        Returns:
+            completed (bool): False if the job has been taken over by another worker.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (STATUS_DONE, time.time(), job_id, worker_id, STATUS_RUNNING))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, message: str, retry_delay: float = 60) -> bool:
+        """
+        Records the failure of a job, which is retried with an exponential backoff until its last attempt.
+
+        Args:
+            job_id (int): The ID of the job.
+            worker_id (str): The ID of the worker running the job.
+            message (str): The error message.
+            retry_delay (float): The delay before the first retry, doubled after each attempt.
+
+        Returns:
+            failed (bool): False if the job has been taken over by another worker.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._transaction()
+            try:
+                row = self._connection.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ? AND status = ?",
+                    (job_id, worker_id, STATUS_RUNNING)).fetchone()
+                if row is None:
+                    self._connection.execute("COMMIT")
+                    return False
+
+                attempts, max_attempts = row
+                if attempts >= max_attempts:
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, last_error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                        (STATUS_FAILED, message, now, job_id))
+                else:
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, last_error = ?, lease_until = NULL, run_at = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (STATUS_PENDING, message, now + retry_delay * 2 ** (attempts - 1), now, job_id))
+                self._connection.execute("COMMIT")
+                return True
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def defer(self, job_id: int, worker_id: str, run_at: float) -> bool:
+        """
+        Puts a running job back in the queue without counting its attempt.
+
+        Args:
+            job_id (int): The ID of the job.
+            worker_id (str): The ID of the worker running the job.
+            run_at (float): The earliest time the job may run again.
+
+        Returns:
+            deferred (bool): False if the job has been taken over by another worker.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, run_at = ?, attempts = attempts - 1, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (STATUS_PENDING, run_at, time.time(), job_id, worker_id, STATUS_RUNNING))
+            return cursor.rowcount == 1
+
+    def count(self, kind: str, status: str = STATUS_PENDING) -> int:
+        """
+        Counts the jobs of a kind in a status.
+
+        Args:
+            kind (str): The kind of the jobs.
+            status (str): The status of the jobs.
+
+        Returns:
+            count (int): The amount of jobs.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM jobs WHERE kind = ? AND status = ?",
+                                            (kind, status)).fetchone()[0]
+
+    def reserve(self, name: str, interval_seconds: float) -> Optional[float]:
+        """
+        Takes a slot of a rate limit shared by all the processes, at most one slot is given per interval.
+
+        Args:
+            name (str): The name of the rate limit.
+            interval_seconds (float): The minimum delay between two slots.
+
+        Returns:
+            available_at (float): None if the slot has been taken, the time of the next free slot otherwise.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._transaction()
+            try:
+                row = self._connection.execute("SELECT next_run_at FROM schedules WHERE name = ?", (name,)).fetchone()
+                if row is not None and row[0] > now:
+                    self._connection.execute("COMMIT")
+                    return row[0]
+
+                self._connection.execute("INSERT OR REPLACE INTO schedules (name, next_run_at) VALUES (?, ?)",
+                                         (name, now + interval_seconds))
+                self._connection.execute("COMMIT")
+                return None
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def get_schedule(self, name: str) -> Optional[float]:
+        """
+        Gets the next run time of a schedule.
+
+        Args:
+            name (str): The name of the schedule.
+
+        Returns:
+            next_run_at (float): The next run time, None if the schedule never ran.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT next_run_at FROM schedules WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else None
+
+    def set_schedule(self, name: str, next_run_at: float) -> None:
+        """
+        Sets the next run time of a schedule.
+
+        Args:
+            name (str): The name of the schedule.
+            next_run_at (float): The next run time.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO schedules (name, next_run_at) VALUES (?, ?)",
+                                     (name, next_run_at))
+
+
+def get_worker_id() -> str:
+    """
+    Gets the ID of the current worker process.
+
+    Returns:
+        id (str): The host name and process ID.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(queue: JobQueue, kind: str, handler: Callable[[dict], None], lease_seconds: float = 600,
+               poll_seconds: float = 10, retry_delay: float = 60) -> None:
+    """
+    Runs the jobs of a kind forever, one at a time, renewing the lease of the running job in the background.
+
+    Args:
+        queue (JobQueue): The job queue.
+        kind (str): The kind of job to run.
+        handler (Callable): Runs a job from its payload, raises if the job failed.
+        lease_seconds (float): The duration of the lease on the running job.
+        poll_seconds (float): The delay between two checks when no job is due.
+        retry_delay (float): The delay before the first retry of a failed job.
+
+    Returns:
+        None
+    """
+    worker_id = get_worker_id()
+    info(f"Worker {worker_id} waiting for {kind} jobs...")
+
+    while True:
+        job = queue.claim(kind, worker_id, lease_seconds)
+        if job is None:
+            time.sleep(poll_seconds)
+            continue
+
+        info(f"Worker {worker_id} running {kind} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+
+        finished = threading.Event()
+        lost = threading.Event()
+
+        def renew() -> None:
+            while not finished.wait(lease_seconds / 3):
+                if not queue.renew_lease(job.id, worker_id, lease_seconds):
+                    warning(f"Lost the lease on {kind} job {job.id}")
+                    lost.set()
+                    return
+
+        renewer = threading.Thread(target=renew, daemon=True)
+        renewer.start()
+
+        # The outcome of a job taken over by another worker is dropped, the other worker records its own
+        try:
+            handler(job.payload)
+            if not lost.is_set() and queue.complete(job.id, worker_id):
+                success(f"Completed {kind} job {job.id}")
+            else:
+                warning(f"Dropped the outcome of {kind} job {job.id}, its lease was lost")
+        except Deferred as e:
+            if not lost.is_set() and queue.defer(job.id, worker_id, e.run_at):
+                info(f"Postponed {kind} job {job.id} to {time.ctime(e.run_at)}: {str(e)}")
+            else:
+                warning(f"Dropped the outcome of {kind} job {job.id}, its lease was lost")
+        except Exception as e:
+            error(f"Error occurred while running {kind} job {job.id}: {str(e)}")
+            if lost.is_set() or not queue.fail(job.id, worker_id, str(e), retry_delay):
+                warning(f"Dropped the outcome of {kind} job {job.id}, its lease was lost")
+        finally:
+            finished.set()
+            renewer.join()
@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import datetime
+
+from src.classes.job_queue import JobQueue
+from src.utils.config import GeneratorConfig, get_generators, get_verbose
+from src.utils.cron import CronSchedule
+from src.utils.status import info
+
+
+class Scheduler:
+    """
+    Enqueues a generation job for each generator according to its schedule.
+
+    The next run times are stored in the queue database, so schedules survive restarts and are never shifted
+    by slow batches.
+    """
+
+    def __init__(self, queue: JobQueue, max_attempts: int = 3) -> None:
+        self._queue = queue
+        self._max_attempts = max_attempts
+
+    @staticmethod
+    def next_run(config: GeneratorConfig, after: float) -> float:
+        """
+        Gets the nominal run time of a generator following a previous one.
+
+        Args:
+            config (GeneratorConfig): The settings of the generator.
+            after (float): The previous nominal run time.
+
+        Returns:
+            next_run_at (float): The next nominal run time.
+        """
+        if config.schedule.cron:
+            return CronSchedule(config.schedule.cron).next_after(datetime.fromtimestamp(after)).timestamp()
+
+        return after + config.schedule.interval_hours * 3600
+
+    def tick(self) -> None:
+        """
+        Enqueues the generation jobs that are due. A generator whose previous job is still queued or running is
+        skipped, runs missed while the scheduler was stopped are not caught up.
+
+        Returns:
+            None
+        """
+        now = time.time()
+
+        for config in get_generators():
+            name = f"generate-{config.id}"
+
+            # A generator that never ran starts right away
+            next_run_at = self._queue.get_schedule(name) or now
+            if next_run_at > now:
+                continue
+
+            jitter = random.uniform(0, config.schedule.jitter_minutes * 60)
+            job_id = self._queue.enqueue("generate", {"generator_id": config.id}, run_at=now + jitter, key=name,
+                                         max_attempts=self._max_attempts)
+            if job_id is not None and get_verbose():
+                info(f"Scheduled generation job {job_id} for generator {config.id} in {jitter / 60:.0f} minutes")
+
+            following = self.next_run(config, next_run_at)
+            while following <= now:
+                following = self.next_run(config, following)
+            self._queue.set_schedule(name, following)
+
+    def run(self, tick_seconds: float = 30) -> None:
+        """
+        Checks the schedules forever.
+
+        Args:
+            tick_seconds (float): The delay between two checks.
+
+        Returns:
+            None
+        """
+        info("Scheduler started.")
+        while True:
+            self.tick()
+            time.sleep(tick_seconds)
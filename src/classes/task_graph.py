@@ -0,0 +1,63 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class TaskGraph:
+    """
+    Dependency graph of named tasks, tasks whose dependencies are satisfied run concurrently.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, Tuple[Callable[..., Any], List[str]]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], dependencies: Optional[List[str]] = None) -> None:
+        """
+        Adds a task to the graph.
+
+        Args:
+            name (str): The name of the task, also the keyword its result is passed as to dependent tasks.
+            func (Callable): The task, called with the result of each dependency as keyword argument.
+            dependencies (List[str]): The names of the tasks this task depends on, they must be added first.
+
+        Returns:
+            None
+        """
+        dependencies = dependencies or []
+
+        if name in self._tasks:
+            raise ValueError(f"Task '{name}' is already defined.")
+        for dependency in dependencies:
+            if dependency not in self._tasks:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dependency}'.")
+
+        self._tasks[name] = (func, dependencies)
+
+    def run(self, max_workers: int = 4) -> Dict[str, Any]:
+        """
+        Runs every task of the graph, as soon as its dependencies are done.
+
+        Args:
+            max_workers (int): The maximum amount of tasks running at the same time.
+
+        Returns:
+            results (Dict[str, Any]): The result of each task, by name.
+        """
+        results: Dict[str, Any] = {}
+        pending = dict(self._tasks)
+        running: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name, (func, dependencies) in list(pending.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        kwargs = {dependency: results[dependency] for dependency in dependencies}
+                        running[executor.submit(func, **kwargs)] = name
+                        del pending[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # Raises the exception of a failed task, dependent tasks are never started
+                    results[name] = future.result()
+
+        return results
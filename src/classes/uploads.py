@@ -0,0 +1,101 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from classes.video import get_video_repository
+from src.classes.generator import Generator
+from src.classes.job_queue import Deferred, JobQueue
+from src.utils.config import GeneratorConfig, get_generator, get_settings
+from src.utils.status import info
+
+
+def enqueue_upload(queue: JobQueue, metadata: dict) -> Optional[int]:
+    """
+    Adds the upload of a generated video to the queue.
+
+    Args:
+        queue (JobQueue): The job queue.
+        metadata (dict): The metadata returned by `Generator.generate_video`.
+
+    Returns:
+        id (int): The ID of the upload job, None if this video is already queued.
+    """
+    job_id = queue.enqueue("upload", metadata, key=f"upload-{metadata['video_id']}",
+                           max_attempts=get_settings().queue.max_attempts)
+    info(f"Queued the upload of \"{metadata['title']}\", {queue.count('upload')} videos waiting for upload")
+    return job_id
+
+
+def next_upload_time(upload_hours: Optional[List[int]], now: float) -> float:
+    """
+    Gets the first time uploads are allowed from now.
+
+    Args:
+        upload_hours (List[int], optional): The local start and end hours of the upload window, which may span
+            midnight (e.g. `[22, 6]`). Uploads are always allowed if omitted.
+        now (float): The current time.
+
+    Returns:
+        time (float): `now` if inside the window, the start of the next window otherwise.
+    """
+    if not upload_hours or upload_hours[0] == upload_hours[1]:
+        return now
+
+    start, end = upload_hours
+    current = datetime.fromtimestamp(now)
+    if start < end:
+        inside = start <= current.hour < end
+    else:
+        inside = current.hour >= start or current.hour < end
+    if inside:
+        return now
+
+    window = current.replace(hour=start, minute=0, second=0, microsecond=0)
+    if window <= current:
+        window += timedelta(days=1)
+    return window.timestamp()
+
+
+def upload(config: GeneratorConfig, metadata: dict) -> str:
+    """
+    Uploads a generated video, records its URL and removes the uploaded file.
+
+    Args:
+        config (GeneratorConfig): The settings of the generator of the video.
+        metadata (dict): The metadata returned by `Generator.generate_video`.
+
+    Returns:
+        url (str): The URL of the uploaded video.
+    """
+    url = Generator(config).upload_video(metadata["video_path"], metadata["title"], metadata["description"])
+    get_video_repository().set_url(metadata["video_id"], url)
+    os.remove(metadata["video_path"])
+    return url
+
+
+def handle_upload_job(queue: JobQueue, payload: dict) -> None:
+    """
+    Runs an upload job, postponing it outside the upload window of its generator or when its channel uploaded
+    too recently.
+
+    Args:
+        queue (JobQueue): The job queue, which also holds the rate limits of the channels.
+        payload (dict): The metadata of the video.
+
+    Returns:
+        None
+    """
+    config = get_generator(payload["generator_id"])
+
+    now = time.time()
+    upload_at = next_upload_time(config.upload_hours, now)
+    if upload_at > now:
+        raise Deferred(upload_at, "outside of the upload hours")
+
+    # Generators sharing a Firefox profile upload to the same channel
+    available_at = queue.reserve(f"channel-{config.firefox_profile}", config.upload_min_interval_minutes * 60)
+    if available_at is not None:
+        raise Deferred(available_at, "the channel uploaded too recently")
+
+    upload(config, payload)
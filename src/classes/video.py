@@ -1,14 +1,31 @@
 import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.utils.config import ROOT_DIR
+from src.utils.status import info
+from src.utils.topic_index import TopicIndex
+
+VIDEOS_DB_PATH = os.path.join(ROOT_DIR, "videos.db")
+LEGACY_VIDEOS_JSON_PATH = "videos.json"
 
 
 class Video:
-    def __init__(self, title: str, description: str, subject: str, script: str, language: str, video_path: str):
+    def __init__(self, title: str, description: str, subject: str, script: str, language: str, video_path: str,
+                 generator_id: int = None, topic: str = None, url: str = None, id: int = None):
+        self.id = id
         self.title = title
         self.description = description
         self.subject = subject
         self.script = script
         self.language = language
         self.video_path = video_path
+        self.generator_id = generator_id
+        self.topic = topic
+        self.url = url
 
     def to_dict(self):
         return {
@@ -17,17 +34,216 @@ class Video:
             "subject": self.subject,
             "script": self.script,
             "language": self.language,
-            "video_path": self.video_path
+            "video_path": self.video_path,
+            "generator_id": self.generator_id,
+            "topic": self.topic,
+            "url": self.url
         }
 
-def save_videos_to_json(video_list):
-    with open("videos.json", 'w') as file:
-        json.dump([video.to_dict() for video in video_list], file, indent=4)
-
-def load_videos_from_json():
-    try:
-        with open("videos.json", 'r') as file:
-            videos_data = json.load(file)
-            return [Video(**video_data) for video_data in videos_data]
-    except:
-        return []
+
+_VIDEO_COLUMNS = "id, title, description, subject, script, language, video_path, generator_id, topic, url"
+
+
+class VideoRepository:
+    """
+    SQLite-backed store of the generated videos, indexed by subject, generator and language.
+    """
+
+    def __init__(self, db_path: str = VIDEOS_DB_PATH) -> None:
+        """
+        Opens the store, creating its schema if needed.
+
+        Args:
+            db_path (str): The path to the SQLite database.
+
+        Returns:
+            None
+        """
+        self._lock = threading.Lock()
+        self._topic_indexes: Dict[str, TopicIndex] = {}
+        # The ID of the last video indexed in the topic index of each subject
+        self._indexed_ids: Dict[str, int] = {}
+        self._connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    description TEXT,
+                    subject TEXT,
+                    script TEXT,
+                    language TEXT,
+                    video_path TEXT,
+                    generator_id INTEGER,
+                    topic TEXT,
+                    url TEXT,
+                    created_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS videos_subject ON videos (subject);
+                CREATE INDEX IF NOT EXISTS videos_generator_id ON videos (generator_id);
+                CREATE INDEX IF NOT EXISTS videos_language ON videos (language);
+            """)
+
+    def add(self, video: Video) -> int:
+        """
+        Appends a video to the store.
+
+        Args:
+            video (Video): The video, its `id` is set to the ID of the stored row.
+
+        Returns:
+            id (int): The ID of the stored video.
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO videos (title, description, subject, script, language, video_path, generator_id, "
+                "topic, url, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video.title, video.description, video.subject, video.script, video.language, video.video_path,
+                 video.generator_id, video.topic, video.url, time.time())
+            )
+        video.id = cursor.lastrowid
+
+        return video.id
+
+    def set_url(self, video_id: int, url: str) -> None:
+        """
+        Sets the YouTube URL of an uploaded video.
+
+        Args:
+            video_id (int): The ID of the video.
+            url (str): The URL of the uploaded video.
+
+        Returns:
+            None
+        """
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE videos SET url = ? WHERE id = ?", (url, video_id))
+
+    def count(self) -> int:
+        """
+        Counts the stored videos.
+
+        Returns:
+            count (int): The amount of videos.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def all(self) -> List[Video]:
+        """
+        Gets every stored video, oldest first.
+
+        Returns:
+            videos (List[Video]): The videos.
+        """
+        return self._select("", ())
+
+    def find_by_subject(self, subject: str) -> List[Video]:
+        return self._select("WHERE subject = ?", (subject,))
+
+    def find_by_generator(self, generator_id: int) -> List[Video]:
+        return self._select("WHERE generator_id = ?", (generator_id,))
+
+    def find_by_language(self, language: str) -> List[Video]:
+        return self._select("WHERE language = ?", (language,))
+
+    def topics(self, subject: Optional[str] = None) -> List[str]:
+        """
+        Gets the topics of the stored videos.
+
+        Args:
+            subject (str, optional): Only the topics of the videos about this subject.
+
+        Returns:
+            topics (List[str]): The topics, oldest first.
+        """
+        query = "SELECT topic FROM videos WHERE topic IS NOT NULL"
+        params = ()
+        if subject is not None:
+            query += " AND subject = ?"
+            params = (subject,)
+
+        with self._lock:
+            return [row[0] for row in self._connection.execute(query + " ORDER BY id", params)]
+
+    def topic_index(self, subject: str) -> TopicIndex:
+        """
+        Gets the similarity index over the topics of a subject, built on first use and then updated with the videos
+        added since the last call, including those added by other processes.
+
+        Args:
+            subject (str): The subject of the videos.
+
+        Returns:
+            index (TopicIndex): The index of the topics.
+        """
+        with self._lock:
+            topic_index = self._topic_indexes.setdefault(subject, TopicIndex())
+            rows = self._connection.execute(
+                "SELECT id, topic FROM videos WHERE subject = ? AND id > ? AND topic IS NOT NULL ORDER BY id",
+                (subject, self._indexed_ids.get(subject, 0))).fetchall()
+            for video_id, topic in rows:
+                topic_index.add(topic)
+                self._indexed_ids[subject] = video_id
+            return topic_index
+
+    def _select(self, where: str, params: tuple) -> List[Video]:
+        with self._lock:
+            rows = self._connection.execute(f"SELECT {_VIDEO_COLUMNS} FROM videos {where} ORDER BY id", params)
+            return [Video(id=row[0], title=row[1], description=row[2], subject=row[3], script=row[4],
+                          language=row[5], video_path=row[6], generator_id=row[7], topic=row[8], url=row[9])
+                    for row in rows]
+
+    def migrate_from_json(self, json_path: str = LEGACY_VIDEOS_JSON_PATH) -> int:
+        """
+        Imports the videos of the legacy `videos.json` file, which is then renamed so it is imported only once.
+        Legacy videos have no topic, their title is used instead so they are still checked for repeated topics.
+
+        Args:
+            json_path (str): The path to the legacy JSON file.
+
+        Returns:
+            count (int): The amount of imported videos.
+        """
+        if not os.path.exists(json_path):
+            return 0
+
+        with open(json_path, "r") as file:
+            videos = [Video(**video_data) for video_data in json.load(file)]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO videos (title, description, subject, script, language, video_path, generator_id, "
+                "topic, url, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(video.title, video.description, video.subject, video.script, video.language, video.video_path,
+                  video.generator_id, video.topic, video.url, None) for video in videos]
+            )
+            # Legacy videos have no topic, their title is the closest match
+            self._connection.execute("UPDATE videos SET topic = title WHERE topic IS NULL AND title IS NOT NULL")
+
+        os.replace(json_path, json_path + ".migrated")
+        info(f"Migrated {len(videos)} videos from \"{json_path}\" to \"{VIDEOS_DB_PATH}\"")
+
+        return len(videos)
+
+
+_repository: Optional[VideoRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_video_repository() -> VideoRepository:
+    """
+    Gets the process-wide video store, importing the legacy `videos.json` file on first use.
+
+    Returns:
+        repository (VideoRepository): The video store.
+    """
+    global _repository
+
+    with _repository_lock:
+        if _repository is None:
+            _repository = VideoRepository()
+            _repository.migrate_from_json()
+        return _repository
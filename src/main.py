@@ -1,37 +1,199 @@
-import random
-from time import sleep
+import argparse
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing import Process
+from queue import Queue
 
 from src.classes.generator import Generator
+from src.classes.job import clean_jobs
+from src.classes.job_queue import JobQueue, run_worker
+from src.classes.scheduler import Scheduler
+from src.classes.uploads import enqueue_upload, handle_upload_job, upload
 from src.utils.config import *
+from src.utils.metrics import reset_timings, timings_table
+from src.utils.tts import warmup_tts
 from src.utils.utils import rem_temp_files
-from utils.status import error, info
+from utils.status import error, info, warning
 
-def main():
 
-    generators_configs = get_generators()
+def run_generator(generator_config: GeneratorConfig, uploads: Queue) -> None:
+    """
+    Generates one video and hands it to the uploader, the failure of a generator does not affect the others.
+
+    Args:
+        generator_config (GeneratorConfig): The settings of the generator
+        uploads (Queue): The videos waiting for upload
+
+    Returns:
+        None
+    """
+    try:
+        generator = Generator(generator_config)
+        uploads.put((generator_config, generator.generate_video(get_settings().queue.max_attempts)))
+    except Exception as e:
+        error(f"Error occurred while generating video for generator {generator_config.id}: {str(e)}")
+
+
+def run_uploader(uploads: Queue) -> int:
+    """
+    Uploads the generated videos until a None item is received, while the next videos are generated.
+
+    Args:
+        uploads (Queue): The videos waiting for upload
+
+    Returns:
+        done (int): The amount of uploaded videos
+    """
     done = 0
-    info(f"Generating {len(generators_configs)} videos...")
-    for generator_config in generators_configs:
+    while True:
+        item = uploads.get()
+        if item is None:
+            return done
+
+        generator_config, metadata = item
         try:
-            generator = Generator(generator_config)
-            data = generator.generate_video()
-            generator.upload_video(data["video_path"], data["title"], data["description"])
+            upload(generator_config, metadata)
             done += 1
         except Exception as e:
-            error(f"Error occurred while generating video: {str(e)}")
-            continue
-    info(f"Generated {done} videos. Exiting...")
+            error(f"Error occurred while uploading video for generator {generator_config.id}: {str(e)}")
+
+
+def main():
+
+    generators_configs = get_generators()
+    parallel_generators = get_settings().parallel_generators
+    reset_timings()
+    start = time.perf_counter()
+    info(f"Generating {len(generators_configs)} videos, {parallel_generators} at a time...")
+
+    uploads = Queue()
+    with ThreadPoolExecutor(max_workers=1) as upload_executor:
+        uploader = upload_executor.submit(run_uploader, uploads)
+        with ThreadPoolExecutor(max_workers=parallel_generators) as executor:
+            for generator_config in generators_configs:
+                executor.submit(run_generator, generator_config, uploads)
+        uploads.put(None)
+        done = uploader.result()
+
+    elapsed = time.perf_counter() - start
+    info(f"Generated {done} videos in {elapsed / 60:.1f} minutes ({done * 3600 / elapsed:.1f} videos/hour). Exiting...")
+    print(timings_table())
+
+
+def handle_generate_job(queue: JobQueue, payload: dict) -> None:
+    """
+    Runs a generation job, then queues the upload of the generated video.
+
+    Args:
+        queue (JobQueue): The job queue, which receives the upload job.
+        payload (dict): The job payload, holding the ID of the generator.
+
+    Returns:
+        None
+    """
+    metadata = Generator(get_generator(payload["generator_id"])).generate_video()
+    enqueue_upload(queue, metadata)
+
+
+def run_generation_worker() -> None:
+    """
+    Runs the generation jobs of the queue forever.
+
+    Returns:
+        None
+    """
+    # Load the TTS models once, every job of this worker reuses them
+    warmup_tts()
+
+    queue = JobQueue()
+    queue_config = get_settings().queue
+    run_worker(queue, "generate", partial(handle_generate_job, queue), queue_config.lease_seconds,
+               queue_config.poll_seconds, queue_config.retry_seconds)
+
+
+def run_upload_worker() -> None:
+    """
+    Runs the upload jobs of the queue forever, following the upload hours and rate limits of the generators.
+
+    Returns:
+        None
+    """
+    queue = JobQueue()
+    queue_config = get_settings().queue
+    run_worker(queue, "upload", partial(handle_upload_job, queue), queue_config.lease_seconds,
+               queue_config.poll_seconds, queue_config.retry_seconds)
+
+
+def run_scheduler() -> None:
+    """
+    Enqueues the generation jobs of the generators forever, according to their schedules.
+
+    Returns:
+        None
+    """
+    Scheduler(JobQueue(), get_settings().queue.max_attempts).run()
+
+
+def run_all() -> None:
+    """
+    Runs the scheduler along with the configured generation and upload workers, stopping the workers on exit.
+
+    Returns:
+        None
+    """
+    queue_config = get_settings().queue
+
+    # The workers are not daemons, as daemon processes can't start the rendering and TTS processes
+    workers = [Process(target=run_generation_worker) for _ in range(queue_config.generation_workers)]
+    # A Firefox profile can only be opened by one browser, which the upload worker keeps open between uploads
+    if queue_config.upload_workers > 1:
+        warning(f"{queue_config.upload_workers} upload workers configured, but only one is supported. Starting one...")
+    workers += [Process(target=run_upload_worker) for _ in range(min(1, queue_config.upload_workers))]
+
+    # Stop on SIGTERM as on Ctrl+C, so the workers are stopped too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        for worker in workers:
+            worker.start()
+
+        run_scheduler()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            if worker.pid is not None:
+                worker.join()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="YASGU : Youtube Automatised Shorts Generator And Uploader")
+    parser.add_argument("--role", choices=["all", "scheduler", "generate", "upload"], default="all",
+                        help="Run the scheduler, a generation worker, an upload worker, or all of them")
+    parser.add_argument("--once", action="store_true",
+                        help="Generate and upload one video per generator, then exit")
+    args = parser.parse_args()
+
     # Setup file tree
     assert_folder_structure()
 
     # Remove temporary files
     rem_temp_files()
+    clean_jobs()
 
-    while True:
-        try:
-            main()
-        except Exception as e:
-            error(f"Error occurred: {str(e)}")
-        sleep(3600*8 + random.randint(0, 3600))
+    if args.once:
+        # Load the TTS models once, every generator reuses them
+        warmup_tts()
+        main()
+    elif args.role == "scheduler":
+        run_scheduler()
+    elif args.role == "generate":
+        run_generation_worker()
+    elif args.role == "upload":
+        run_upload_worker()
+    else:
+        run_all()
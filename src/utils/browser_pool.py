@@ -0,0 +1,123 @@
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from src.utils.config import get_settings, get_verbose
+from src.utils.status import info, warning
+from src.utils.web_browser import init_browser
+
+
+class _Session:
+    def __init__(self, browser: webdriver.Firefox) -> None:
+        self.browser = browser
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    Keeps one logged-in browser alive per Firefox profile across uploads.
+
+    A Firefox profile can only be opened by one browser at a time, so each session is used by one upload at a time.
+    Sessions are replaced when they stop responding, when an upload fails and after `max_uses` uploads.
+    """
+
+    def __init__(self, max_uses: int = 20) -> None:
+        self._max_uses = max_uses
+        self._sessions: Dict[str, _Session] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _get_lock(self, firefox_profile: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(firefox_profile, threading.Lock())
+
+    @staticmethod
+    def _is_alive(session: _Session) -> bool:
+        try:
+            # Any command fails once Firefox or geckodriver crashed
+            session.browser.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _close(self, firefox_profile: str) -> None:
+        session = self._sessions.pop(firefox_profile, None)
+        if session is None:
+            return
+
+        try:
+            session.browser.quit()
+        except WebDriverException:
+            pass
+
+    @contextmanager
+    def session(self, firefox_profile: str):
+        """
+        Lends the browser of a profile, starting it if needed.
+
+        Args:
+            firefox_profile (str): The path to the Firefox profile logged in to the YouTube account.
+
+        Returns:
+            browser (webdriver.Firefox): The browser, which must not be quit by the caller.
+        """
+        with self._get_lock(firefox_profile):
+            session: Optional[_Session] = self._sessions.get(firefox_profile)
+            if session is not None and not self._is_alive(session):
+                warning("Browser session stopped responding, restarting it...")
+                self._close(firefox_profile)
+                session = None
+
+            if session is None:
+                if get_verbose():
+                    info(f" => Starting browser for profile \"{firefox_profile}\"")
+                session = _Session(init_browser(firefox_profile))
+                self._sessions[firefox_profile] = session
+
+            try:
+                yield session.browser
+            except Exception:
+                # The page may be left in any state, start from a fresh browser
+                self._close(firefox_profile)
+                raise
+
+            session.uses += 1
+            if session.uses >= self._max_uses:
+                self._close(firefox_profile)
+
+    def close_all(self) -> None:
+        """
+        Quits all the browsers of the pool.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            profiles = list(self._sessions)
+        for firefox_profile in profiles:
+            with self._get_lock(firefox_profile):
+                self._close(firefox_profile)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Gets the browser pool shared by the generators of this process, the browsers are quit at exit.
+
+    Returns:
+        pool (BrowserPool): The browser pool.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(get_settings().browser_max_uses)
+            atexit.register(_pool.close_all)
+        return _pool
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+from uuid import uuid4
+
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache, entries expire after a TTL and the least recently used ones are
+    evicted once the cache grows over its size limit.
+
+    The modification time of an entry is its creation time and the access time is its last hit.
+    """
+
+    def __init__(self, directory: str, max_size_bytes: int, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            directory (str): The folder holding the entries.
+            max_size_bytes (int): The size above which the least recently used entries are evicted.
+            ttl_seconds (float, optional): The lifetime of an entry, entries never expire if None.
+
+        Returns:
+            None
+        """
+        self._directory = directory
+        self._max_size_bytes = max_size_bytes
+        self._ttl_seconds = ttl_seconds
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Builds a cache key from the given parts.
+
+        Args:
+            parts (str): The values identifying the entry.
+
+        Returns:
+            key (str): The hex digest of the parts.
+        """
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Gets an entry of the cache.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            value (bytes): The cached value, None if missing or expired.
+        """
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if self._ttl_seconds is not None and now - stat.st_mtime > self._ttl_seconds:
+                self._remove(path, stat.st_size)
+                return None
+
+            with open(path, "rb") as file:
+                value = file.read()
+
+            # Mark the entry as recently used, keep its creation time
+            os.utime(path, (now, stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Stores an entry in the cache, evicting the least recently used entries if needed.
+
+        Args:
+            key (str): The key of the entry.
+            value (bytes): The value to store.
+
+        Returns:
+            None
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid4()}.tmp"
+
+        with open(tmp_path, "wb") as file:
+            file.write(value)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(value)
+            if self._size is None or self._size > self._max_size_bytes:
+                self._evict()
+
+    def _remove(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _evict(self) -> None:
+        """
+        Recomputes the size of the cache from disk and evicts the least recently used entries until it
+        fits. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                try:
+                    entries.append((entry.stat().st_atime, entry.stat().st_size, entry.path))
+                except FileNotFoundError:
+                    continue
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self._max_size_bytes:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except FileNotFoundError:
+                continue
+
+        self._size = size
@@ -1,11 +1,177 @@
 import json
 import os
 import sys
+import threading
+from typing import Dict, List, Optional
 
 from termcolor import colored
 
 ROOT_DIR = os.path.dirname(sys.path[0])
 
+CONFIG_PATH = os.path.join(ROOT_DIR, "config/config.json")
+
+
+class ScheduleConfig:
+    """
+    Typed settings of the schedule of a generator, either a cron expression or a fixed interval.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.cron: Optional[str] = config.get("cron")
+        self.interval_hours: float = config.get("interval_hours", 8)
+        self.jitter_minutes: float = config.get("jitter_minutes", 60)
+
+
+class QueueConfig:
+    """
+    Typed settings of the job queue and its workers.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.generation_workers: int = config.get("generation_workers", 1)
+        self.upload_workers: int = config.get("upload_workers", 1)
+        self.lease_seconds: float = config.get("lease_minutes", 10) * 60
+        self.poll_seconds: float = config.get("poll_seconds", 10)
+        self.max_attempts: int = config.get("max_attempts", 3)
+        self.retry_seconds: float = config.get("retry_minutes", 5) * 60
+
+
+class GeneratorConfig:
+    """
+    Typed settings of a single generator, built from one entry of the `generators` list.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.id: int = config["id"]
+        self.language: str = config["language"]
+        self.subject: str = config["subject"]
+        self.llm: str = config["llm"]
+        self.image_prompt_llm: str = config["image_prompt_llm"]
+        self.image_model: str = config["image_model"]
+        self.image_fallbacks: List[str] = config.get("image_fallbacks", [])
+        self.images_count: int = config["images_count"]
+        self.is_for_kids: bool = config["is_for_kids"]
+        self.font: str = config["font"]
+        self.subtitles_max_chars: int = config["subtitles_max_chars"]
+        self.subtitles_font_size: int = config["subtitles_font_size"]
+        self.subtitles_font_color: str = config["subtitles_font_color"]
+        self.subtitles_font_outline_color: str = config["subtitles_font_outline_color"]
+        self.subtitles_font_outline_thickness: int = config["subtitles_font_outline_thickness"]
+        self.audio_song_volume: float = config["audio_song_volume"]
+        self.firefox_profile: str = config["firefox_profile"]
+        self.schedule: ScheduleConfig = ScheduleConfig(config.get("schedule", {}))
+        self.upload_min_interval_minutes: float = config.get("upload_min_interval_minutes", 0)
+        self.upload_hours: Optional[List[int]] = config.get("upload_hours")
+        self.subtitles_backend: str = config.get("subtitles_backend", "assemblyai")
+        self.render_backend: str = config.get("render_backend", "moviepy")
+        self.render_chunks: int = config.get("render_chunks", 1)
+        self.topic_similarity_threshold: float = config.get("topic_similarity_threshold", 0.75)
+        self.topic_similarity_margin: float = config.get("topic_similarity_margin", 0.25)
+
+
+class CacheConfig:
+    """
+    Typed settings of an on-disk cache.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.enabled: bool = config.get("enabled", True)
+        self.ttl_seconds: Optional[float] = config["ttl_hours"] * 3600 if config.get("ttl_hours") else None
+        self.max_size_bytes: int = int(config.get("max_size_mb", 100) * 1024 * 1024)
+
+
+class ImageReuseConfig:
+    """
+    Typed settings of the library of generated images.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.enabled: bool = config.get("enabled", True)
+        self.similarity_threshold: float = config.get("similarity_threshold", 0.8)
+        self.duplicate_distance: int = config.get("duplicate_distance", 6)
+        self.max_size_bytes: int = int(config.get("max_size_mb", 500) * 1024 * 1024)
+
+
+class LlmConfig:
+    """
+    Typed settings of the LLM requests.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.timeout_seconds: float = config.get("timeout_seconds", 120)
+        self.hedge_percentile: float = config.get("hedge_percentile", 90)
+        self.hedge_after_seconds: float = config.get("hedge_after_seconds", 30)
+        self.max_in_flight: int = config.get("max_in_flight", 2)
+
+
+class HttpConfig:
+    """
+    Typed settings of the HTTP client.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.timeout_seconds: float = config.get("timeout_seconds", 60)
+        self.max_attempts: int = config.get("max_attempts", 5)
+        self.backoff_seconds: float = config.get("backoff_seconds", 1)
+        self.max_backoff_seconds: float = config.get("max_backoff_seconds", 30)
+        self.pool_size: int = config.get("pool_size", 16)
+
+
+class Settings:
+    """
+    Typed view of `config/config.json`.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.verbose: bool = config["verbose"]
+        self.headless: bool = config["headless"]
+        self.threads: int = config["threads"]
+        self.assembly_ai_api_key: str = config["assembly_ai_api_key"]
+        self.imagemagick_path: str = config["imagemagick_path"]
+        self.image_api_url: str = config.get("image_api_url", "https://hercai.onrender.com/{model}/text2image")
+        self.http: HttpConfig = HttpConfig(config.get("http", {}))
+        # Relative to the project folder
+        self.image_library_dir: str = os.path.join(ROOT_DIR, config.get("image_library_dir", "assets/images"))
+        self.image_library_threshold: float = config.get("image_library_threshold", 0.5)
+        self.image_reuse: ImageReuseConfig = ImageReuseConfig(config.get("image_reuse", {}))
+        self.image_provider_slow_seconds: float = config.get("image_provider_slow_seconds", 30)
+        self.image_concurrency: Dict[str, int] = config.get("image_concurrency", {})
+        self.parallel_generators: int = config.get("parallel_generators", 1)
+        self.resource_limits: Dict[str, int] = config.get("resource_limits", {})
+        self.tts_workers: int = config.get("tts_workers", 1)
+        self.browser_max_uses: int = config.get("browser_max_uses", 20)
+        self.upload_timeouts: Dict[str, float] = config.get("upload_timeouts", {})
+        self.queue: QueueConfig = QueueConfig(config.get("queue", {}))
+        self.llm: LlmConfig = LlmConfig(config.get("llm", {}))
+        self.llm_cache: CacheConfig = CacheConfig(config.get("llm_cache", {}))
+        self.tts_cache: CacheConfig = CacheConfig(config.get("tts_cache", {}))
+        self.generators: List[GeneratorConfig] = [GeneratorConfig(generator) for generator in config["generators"]]
+
+
+_settings: Optional[Settings] = None
+_settings_mtime: Optional[int] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """
+    Gets the settings, parsing the config file only when it changed since the last call.
+
+    Returns:
+        settings (Settings): The current settings
+    """
+    global _settings, _settings_mtime
+
+    mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    if _settings is None or mtime != _settings_mtime:
+        with _settings_lock:
+            if _settings is None or mtime != _settings_mtime:
+                with open(CONFIG_PATH, "r") as file:
+                    _settings = Settings(json.load(file))
+                _settings_mtime = mtime
+
+    return _settings
+
 
 def assert_folder_structure() -> None:
     """
@@ -38,8 +204,7 @@ def get_verbose() -> bool:
     Returns:
         verbose (bool): The verbose flag
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["verbose"]
+    return get_settings().verbose
 
 
 def get_headless() -> bool:
@@ -49,19 +214,34 @@ def get_headless() -> bool:
     Returns:
         headless (bool): The headless flag
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["headless"]
+    return get_settings().headless
 
 
-def get_generators() -> list:
+def get_generators() -> List[GeneratorConfig]:
     """
     Gets the list of generators from the config file.
 
     Returns:
-        generators (list): The list of generators
+        generators (List[GeneratorConfig]): The list of generators
+    """
+    return get_settings().generators
+
+
+def get_generator(generator_id: int) -> GeneratorConfig:
+    """
+    Gets a generator from the config file.
+
+    Args:
+        generator_id (int): The ID of the generator
+
+    Returns:
+        generator (GeneratorConfig): The generator
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["generators"]
+    for generator in get_generators():
+        if generator.id == generator_id:
+            return generator
+
+    raise ValueError(f"No generator with ID {generator_id} in the config file.")
 
 
 def get_threads() -> int:
@@ -71,8 +251,7 @@ def get_threads() -> int:
     Returns:
         threads (int): Amount of threads
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["threads"]
+    return get_settings().threads
 
 
 def get_assemblyai_api_key() -> str:
@@ -82,8 +261,7 @@ def get_assemblyai_api_key() -> str:
     Returns:
         key (str): The AssemblyAI API key
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["assembly_ai_api_key"]
+    return get_settings().assembly_ai_api_key
 
 
 def get_fonts_dir() -> str:
@@ -96,6 +274,16 @@ def get_fonts_dir() -> str:
     return os.path.join(ROOT_DIR, "assets/fonts")
 
 
+def get_cache_dir() -> str:
+    """
+    Gets the folder holding the on-disk caches.
+
+    Returns:
+        dir (str): The cache directory
+    """
+    return os.path.join(ROOT_DIR, "cache")
+
+
 def get_imagemagick_path() -> str:
     """
     Gets the path to ImageMagick.
@@ -103,5 +291,18 @@ def get_imagemagick_path() -> str:
     Returns:
         path (str): The path to ImageMagick
     """
-    with open(os.path.join(ROOT_DIR, "config/config.json"), "r") as file:
-        return json.load(file)["imagemagick_path"]
+    return get_settings().imagemagick_path
+
+
+def get_image_concurrency(image_model: str) -> int:
+    """
+    Gets the maximum amount of images generated at the same time with an image model.
+
+    Args:
+        image_model (str): The image model
+
+    Returns:
+        concurrency (int): The concurrency limit, falls back to the `default` entry
+    """
+    image_concurrency = get_settings().image_concurrency
+    return max(1, image_concurrency.get(image_model, image_concurrency.get("default", 4)))
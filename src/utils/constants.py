@@ -10,6 +10,10 @@ YOUTUBE_NOT_MADE_FOR_KIDS_NAME = "VIDEO_MADE_FOR_KIDS_NOT_MFK"
 YOUTUBE_NEXT_BUTTON_ID = "next-button"
 YOUTUBE_RADIO_BUTTON_XPATH = "//*[@id=\"radioLabel\"]"
 YOUTUBE_DONE_BUTTON_ID = "done-button"
+YOUTUBE_FILE_PICKER_TAG = "ytcp-uploads-file-picker"
+YOUTUBE_UPLOAD_PROGRESS_CSS = "ytcp-video-upload-progress .progress-label"
+YOUTUBE_VIDEO_ROW_TAG = "ytcp-video-row"
+YOUTUBE_VIDEO_LINK_CSS = "ytcp-video-info .video-url-fadeable a"
 
 def build_is_topic_already_covered_prompt(already_covered: str, subject: str) -> str:
     return (f"Here is a list of already covered subject : {already_covered}. "
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from typing import Set
+
+
+def _parse_field(field: str, minimum: int, maximum: int) -> Set[int]:
+    """
+    Parses one field of a cron expression, supporting `*`, `a-b`, `*/n`, `a-b/n` and comma separated lists.
+
+    Args:
+        field (str): The field.
+        minimum (int): The smallest allowed value.
+        maximum (int): The largest allowed value.
+
+    Returns:
+        values (Set[int]): The values matched by the field.
+    """
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/")
+            step = int(step_text)
+
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-"))
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+
+        if start < minimum or end > maximum or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute, hour, day of month, month and day of week (0 or 7 is Sunday).
+    """
+
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"A cron expression has 5 fields: {expression}")
+
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7)}
+
+        # Like cron, when both days are restricted a date matches if either of them does
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, date: datetime) -> bool:
+        day_matches = date.day in self.days
+        weekday_matches = (date.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_matches and weekday_matches
+        return day_matches or weekday_matches
+
+    def next_after(self, after: datetime) -> datetime:
+        """
+        Gets the first time matched by the expression strictly after a time.
+
+        Args:
+            after (datetime): The time to start from.
+
+        Returns:
+            next (datetime): The next matching time.
+        """
+        date = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        # Bounded to a few years, an expression like `0 0 31 2 *` never matches
+        limit = date + timedelta(days=366 * 5)
+        while date < limit:
+            if date.month not in self.months:
+                date = (date.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(date):
+                date = date.replace(hour=0, minute=0) + timedelta(days=1)
+            elif date.hour not in self.hours:
+                date = date.replace(minute=0) + timedelta(hours=1)
+            elif date.minute not in self.minutes:
+                date += timedelta(minutes=1)
+            else:
+                return date
+
+        raise ValueError("The cron expression never matches.")
@@ -0,0 +1,246 @@
+import os
+import subprocess
+from typing import List, Tuple
+
+from moviepy.config import get_setting
+
+FPS = 30
+
+
+def get_ffmpeg_binary() -> str:
+    """
+    Gets the FFmpeg binary, the same one MoviePy uses.
+
+    Returns:
+        path (str): The path to FFmpeg.
+    """
+    return get_setting("FFMPEG_BINARY")
+
+
+def _quote(path: str) -> str:
+    return "'" + os.path.abspath(path).replace("\\", "/").replace("'", "'\\''") + "'"
+
+
+def write_concat_list(timeline: List[Tuple[str, float]], list_path: str) -> str:
+    """
+    Writes the list of images and durations read by the FFmpeg concat demuxer.
+
+    Args:
+        timeline (List[Tuple[str, float]]): The path and display duration of each image, in order.
+        list_path (str): The path of the list file.
+
+    Returns:
+        path (str): The path of the list file.
+    """
+    with open(list_path, "w", encoding="utf-8") as file:
+        file.write("ffconcat version 1.0\n")
+        for image_path, duration in timeline:
+            file.write(f"file {_quote(image_path)}\nduration {duration:.6f}\n")
+        # The duration of the last entry is only honored if the file is listed again
+        file.write(f"file {_quote(timeline[-1][0])}\n")
+
+    return list_path
+
+
+def run_ffmpeg(args: List[str]) -> None:
+    """
+    Runs FFmpeg, raising with the end of its output if it fails.
+
+    Args:
+        args (List[str]): The arguments given to FFmpeg.
+
+    Returns:
+        None
+    """
+    process = subprocess.run([get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + args,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed: {process.stderr.decode('utf-8', errors='replace')[-2000:]}")
+
+
+def _overlay_filters(overlays: List[Tuple[str, float, float]], first_input: int) -> List[str]:
+    """
+    Builds the filters showing the images of input 0 with the subtitle sprites overlaid, into `[vout]`.
+
+    Args:
+        overlays (List[Tuple[str, float, float]]): The path, start and end time of each subtitle sprite.
+        first_input (int): The index of the input of the first sprite.
+
+    Returns:
+        filters (List[str]): The video filters.
+    """
+    filters = [f"[0:v]fps={FPS},setsar=1[v0]"]
+    for i, (_, start, end) in enumerate(overlays):
+        filters.append(f"[v{i}][{i + first_input}:v]overlay=x=(W-w)/2:y=(H-h)/2:"
+                       f"enable='between(t,{start:.3f},{end:.3f})'[v{i + 1}]")
+    filters.append(f"[v{len(overlays)}]format=yuv420p[vout]")
+
+    return filters
+
+
+def _audio_filters(song_volume: float, tts_input: int, song_input: int) -> List[str]:
+    """
+    Builds the filters mixing the voice with the background song, into `[aout]`.
+
+    Args:
+        song_volume (float): The volume of the background song.
+        tts_input (int): The index of the voice input.
+        song_input (int): The index of the song input.
+
+    Returns:
+        filters (List[str]): The audio filters.
+    """
+    # Without normalization amix sums its inputs, so the voice keeps its volume once the song has ended
+    return [
+        f"[{song_input}:a]volume={song_volume}[song]",
+        f"[{tts_input}:a][song]amix=inputs=2:duration=first:normalize=0[aout]"
+    ]
+
+
+# Encoder settings shared by every render, so that segments can be concatenated without re-encoding
+VIDEO_CODEC_ARGS = ["-c:v", "libx264", "-preset", "medium", "-r", str(FPS)]
+AUDIO_CODEC_ARGS = ["-c:a", "aac", "-ar", "44100", "-ac", "2"]
+
+
+def _run_filter_graph(inputs: List[str], filters: List[str], outputs: List[str], filter_path: str) -> None:
+    # The graph goes through a file, it easily exceeds the command line limit on Windows
+    with open(filter_path, "w", encoding="utf-8") as file:
+        file.write(";\n".join(filters))
+
+    try:
+        run_ffmpeg(inputs + ["-filter_complex_script", filter_path] + outputs)
+    finally:
+        if os.path.exists(filter_path):
+            os.remove(filter_path)
+
+
+def render_with_ffmpeg(timeline: List[Tuple[str, float]], overlays: List[Tuple[str, float, float]], tts_path: str,
+                       song_path: str, song_volume: float, duration: float, output_path: str, threads: int) -> str:
+    """
+    Renders the video in a single native FFmpeg pass: the images are concatenated, the subtitle sprites are
+    overlaid while their cue is displayed and the voice is mixed with the background song.
+
+    Args:
+        timeline (List[Tuple[str, float]]): The path and display duration of each 1080x1920 image, in order.
+        overlays (List[Tuple[str, float, float]]): The path, start and end time of each subtitle sprite.
+        tts_path (str): The path to the voice.
+        song_path (str): The path to the background song.
+        song_volume (float): The volume of the background song.
+        duration (float): The duration of the video.
+        output_path (str): The path of the MP4 file.
+        threads (int): The amount of threads used by the encoder.
+
+    Returns:
+        path (str): The path of the MP4 file.
+    """
+    work_path = os.path.splitext(output_path)[0]
+    list_path = write_concat_list(timeline, work_path + "_images.txt")
+
+    inputs = ["-f", "concat", "-safe", "0", "-i", list_path]
+    for overlay_path, _, _ in overlays:
+        inputs += ["-i", overlay_path]
+    inputs += ["-i", tts_path, "-i", song_path]
+
+    tts_input = len(overlays) + 1
+    filters = _overlay_filters(overlays, 1) + _audio_filters(song_volume, tts_input, tts_input + 1)
+
+    try:
+        _run_filter_graph(inputs, filters, [
+            "-map", "[vout]", "-map", "[aout]"
+        ] + VIDEO_CODEC_ARGS + AUDIO_CODEC_ARGS + [
+            "-t", f"{duration:.3f}",
+            "-threads", str(threads),
+            output_path
+        ], work_path + "_filter.txt")
+    finally:
+        os.remove(list_path)
+
+    return output_path
+
+
+def render_video_segment(timeline: List[Tuple[str, float]], overlays: List[Tuple[str, float, float]],
+                         duration: float, output_path: str, threads: int) -> str:
+    """
+    Renders a silent part of the video, with the same encoder settings as every other segment.
+
+    Args:
+        timeline (List[Tuple[str, float]]): The path and display duration of each image of the segment.
+        overlays (List[Tuple[str, float, float]]): The path, start and end time (relative to the segment) of
+            each subtitle sprite.
+        duration (float): The duration of the segment.
+        output_path (str): The path of the MP4 file.
+        threads (int): The amount of threads used by the encoder.
+
+    Returns:
+        path (str): The path of the MP4 file.
+    """
+    work_path = os.path.splitext(output_path)[0]
+    list_path = write_concat_list(timeline, work_path + "_images.txt")
+
+    inputs = ["-f", "concat", "-safe", "0", "-i", list_path]
+    for overlay_path, _, _ in overlays:
+        inputs += ["-i", overlay_path]
+
+    try:
+        _run_filter_graph(inputs, _overlay_filters(overlays, 1), [
+            "-map", "[vout]", "-an"
+        ] + VIDEO_CODEC_ARGS + [
+            "-t", f"{duration:.3f}",
+            "-threads", str(threads),
+            output_path
+        ], work_path + "_filter.txt")
+    finally:
+        os.remove(list_path)
+
+    return output_path
+
+
+def concat_segments(segment_paths: List[str], output_path: str) -> str:
+    """
+    Joins video segments encoded with identical settings, without re-encoding them.
+
+    Args:
+        segment_paths (List[str]): The paths of the segments, in order.
+        output_path (str): The path of the joined MP4 file.
+
+    Returns:
+        path (str): The path of the joined MP4 file.
+    """
+    list_path = os.path.splitext(output_path)[0] + "_segments.txt"
+    with open(list_path, "w", encoding="utf-8") as file:
+        file.write("ffconcat version 1.0\n")
+        for segment_path in segment_paths:
+            file.write(f"file {_quote(segment_path)}\n")
+
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+    finally:
+        os.remove(list_path)
+
+    return output_path
+
+
+def mux_audio(video_path: str, tts_path: str, song_path: str, song_volume: float, duration: float,
+              output_path: str) -> str:
+    """
+    Adds the voice mixed with the background song to a silent video, the video stream is copied.
+
+    Args:
+        video_path (str): The path of the silent video.
+        tts_path (str): The path to the voice.
+        song_path (str): The path to the background song.
+        song_volume (float): The volume of the background song.
+        duration (float): The duration of the video.
+        output_path (str): The path of the MP4 file.
+
+    Returns:
+        path (str): The path of the MP4 file.
+    """
+    _run_filter_graph(["-i", video_path, "-i", tts_path, "-i", song_path], _audio_filters(song_volume, 1, 2), [
+        "-map", "0:v", "-map", "[aout]", "-c:v", "copy"
+    ] + AUDIO_CODEC_ARGS + [
+        "-t", f"{duration:.3f}",
+        output_path
+    ], os.path.splitext(output_path)[0] + "_filter.txt")
+
+    return output_path
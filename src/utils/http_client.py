@@ -0,0 +1,153 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
+from urllib.parse import urlparse
+from uuid import uuid4
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.config import HttpConfig, get_settings, get_verbose
+from src.utils.metrics import record_timing
+from src.utils.status import info, warning
+
+# Status codes worth retrying, the others are errors of the request itself
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class RetryableHTTPError(Exception):
+    """
+    Raised for a response whose status code may succeed on a later attempt.
+    """
+
+
+def get_session() -> requests.Session:
+    """
+    Gets the process-wide HTTP session, shared by every thread so its connections outlive the thread pools.
+
+    Returns:
+        session (requests.Session): The session, its pool keeps up to `pool_size` connections per host alive.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            pool_size = get_settings().http.pool_size
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def backoff_delay(attempt: int, config: HttpConfig) -> float:
+    """
+    Gets the delay before a retry, exponential in the attempt with full jitter.
+
+    Args:
+        attempt (int): The failed attempt, starting at 1.
+        config (HttpConfig): The HTTP settings.
+
+    Returns:
+        delay (float): The delay in seconds.
+    """
+    return random.uniform(0, min(config.max_backoff_seconds, config.backoff_seconds * 2 ** (attempt - 1)))
+
+
+def _record_latency(method: str, url: str, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    host = urlparse(url).netloc
+    record_timing(f"http {host}", elapsed)
+    if get_verbose():
+        info(f" => {method} {host} took {elapsed * 1000:.0f}ms")
+
+
+def _check_status(status: int, url: str) -> None:
+    if status in RETRY_STATUS_CODES:
+        raise RetryableHTTPError(f"HTTP {status} from {url}")
+
+
+def with_retries(request: Callable[[], T], description: str) -> T:
+    """
+    Runs a request, retrying connection errors, timeouts and retryable statuses with a bounded backoff.
+
+    Args:
+        request (Callable): Sends the request and returns its result.
+        description (str): The request, for the logs.
+
+    Returns:
+        result (Any): The result of the request.
+    """
+    config = get_settings().http
+    attempt = 1
+    while True:
+        try:
+            return request()
+        except (requests.ConnectionError, requests.Timeout, RetryableHTTPError) as e:
+            if attempt >= config.max_attempts:
+                raise
+            delay = backoff_delay(attempt, config)
+            warning(f" => {description} failed ({str(e)}), retrying in {delay:.1f}s ({attempt}/{config.max_attempts})")
+            time.sleep(delay)
+            attempt += 1
+
+
+def get_json(url: str, params: Optional[dict] = None) -> Any:
+    """
+    Sends a GET request and decodes its JSON response.
+
+    Args:
+        url (str): The URL.
+        params (dict, optional): The query parameters, URL-encoded.
+
+    Returns:
+        json (Any): The decoded response.
+    """
+    def request() -> Any:
+        start = time.perf_counter()
+        response = get_session().get(url, params=params, timeout=get_settings().http.timeout_seconds)
+        _record_latency("GET", url, start)
+        _check_status(response.status_code, url)
+        response.raise_for_status()
+        return response.json()
+
+    return with_retries(request, f"GET {url}")
+
+
+def download(url: str, path: str, chunk_size: int = 64 * 1024) -> str:
+    """
+    Downloads a file in chunks, the file only appears at its path once complete.
+
+    Args:
+        url (str): The URL of the file.
+        path (str): The path to write the file to.
+        chunk_size (int): The size of the chunks written to disk.
+
+    Returns:
+        path (str): The path to the downloaded file.
+    """
+    def request() -> str:
+        start = time.perf_counter()
+        tmp_path = f"{path}.{uuid4()}.tmp"
+        try:
+            with get_session().get(url, stream=True, timeout=get_settings().http.timeout_seconds) as response:
+                _check_status(response.status_code, url)
+                response.raise_for_status()
+                with open(tmp_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size):
+                        file.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _record_latency("GET", url, start)
+        return path
+
+    return with_retries(request, f"Download of {url}")
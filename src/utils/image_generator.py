@@ -1,47 +1,84 @@
 import os
-from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
-import requests
+from src.utils.image_library import get_image_library, hash_distance, perceptual_hash
+from src.utils.image_providers import HttpImageProvider, generate_with_failover, get_image_provider
+from utils.config import get_verbose, get_image_concurrency, get_settings
+from utils.status import info, warning
 
-from utils.config import get_verbose
-from utils.status import info
 
-
-def generate_image(prompt: str, image_model: str, generation_path: str) -> str:
+def generate_images(prompts: List[str], image_model: str, generation_path: str, max_attempts: int = 3,
+                    fallbacks: Optional[List[str]] = None) -> List[str]:
     """
-    Generates an AI Image based on the given prompt.
+    Generates one AI Image per prompt concurrently, bounded by the concurrency limit of the image model.
+    Each image is generated by the first backend which succeeds, failed and slow backends are tried last.
+
+    Images of the library generated from a similar prompt are reused instead, and images looking the same as
+    a previous image of the video are replaced once.
 
     Args:
-        prompt (str): Reference for image generation
+        prompts (List[str]): References for image generation
+        image_model (str): The image model or backend to use
+        generation_path (str): The folder to write the images to
+        max_attempts (int): The maximum amount of attempts per prompt
+        fallbacks (List[str], optional): The backends to use when the image model fails, in order of preference
 
     Returns:
-        path (str): The path to the generated image.
+        paths (List[str]): The paths to the generated images, in prompt order.
     """
-    ok = False
-    while not ok:
-        url = f"https://hercai.onrender.com/{image_model}/text2image?prompt={prompt}"
+    backends = [image_model] + [name for name in fallbacks or [] if name != image_model]
+    library = get_image_library()
+    reuse_config = get_settings().image_reuse
 
-        r = requests.get(url)
-        parsed = r.json()
+    def generate(prompt: str, exclude: Optional[List[int]] = None) -> str:
+        if library is not None:
+            reused = library.find(prompt, reuse_config.similarity_threshold, generation_path, exclude)
+            if reused is not None:
+                return reused
 
-        if "url" not in parsed or not parsed.get("url"):
-            # Retry
-            if get_verbose():
-                info(f" => Failed to generate Image for Prompt: {prompt}. Retrying...")
-            ok = False
-        else:
-            ok = True
+        attempt = 1
+        while True:
+            try:
+                image_path, backend = generate_with_failover(prompt, backends, generation_path)
+                if get_verbose():
+                    info(f" => Wrote Image to \"{image_path}\"\n")
 
-            image_url = parsed["url"]
-            image_path = os.path.join(generation_path, str(uuid4()) + ".png")
+                # Local backends can produce their images again at no cost
+                if library is not None and isinstance(get_image_provider(backend), HttpImageProvider):
+                    library.add(prompt, image_path)
+                return image_path
+            except Exception as e:
+                if attempt >= max_attempts:
+                    raise
+                warning(f" => Failed to generate Image for Prompt: {prompt} ({str(e)}). "
+                        f"Retrying ({attempt}/{max_attempts})...")
+                attempt += 1
 
-            with open(image_path, "wb") as image_file:
-                # Write bytes to file
-                image_r = requests.get(image_url)
+    if not prompts:
+        return []
 
-                image_file.write(image_r.content)
+    with ThreadPoolExecutor(max_workers=min(len(prompts), get_image_concurrency(image_model))) as executor:
+        paths = list(executor.map(generate, prompts))
 
-            if get_verbose():
-                info(f" => Wrote Image to \"{image_path}\"\n")
+    # Replace the near-duplicate frames, a second duplicate is kept rather than failing the video
+    hashes = []
+    for i, prompt in enumerate(prompts):
+        phash = perceptual_hash(paths[i])
+        if any(hash_distance(phash, previous) <= reuse_config.duplicate_distance for previous in hashes):
+            warning(f" => Image for Prompt: {prompt} looks like a previous image of the video, replacing it...")
+            try:
+                replacement = generate(prompt, hashes)
+                replacement_hash = perceptual_hash(replacement)
+            except Exception as e:
+                warning(f" => Failed to replace Image for Prompt: {prompt} ({str(e)}), keeping it.")
+                hashes.append(phash)
+                continue
+            if all(hash_distance(replacement_hash, previous) > reuse_config.duplicate_distance for previous in hashes):
+                os.remove(paths[i])
+                paths[i], phash = replacement, replacement_hash
+            else:
+                os.remove(replacement)
+        hashes.append(phash)
 
-            return image_path
\ No newline at end of file
+    return paths
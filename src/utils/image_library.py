@@ -0,0 +1,311 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+from uuid import uuid4
+
+import numpy as np
+from PIL import Image
+
+from src.utils.config import get_cache_dir, get_settings, get_verbose
+from src.utils.status import info
+from src.utils.topic_index import TopicIndex
+
+# Side of the grayscale thumbnail the hash is computed from, and of the kept low frequencies
+_HASH_SIZE = 32
+_HASH_BITS_SIZE = 8
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size: int) -> np.ndarray:
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    return np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+
+
+def perceptual_hash(image_path: str) -> int:
+    """
+    Computes the DCT perceptual hash of an image, which barely changes when the image is resized, recompressed
+    or slightly edited.
+
+    Args:
+        image_path (str): The path to the image.
+
+    Returns:
+        hash (int): The 64-bit hash.
+    """
+    with Image.open(image_path) as image:
+        pixels = np.asarray(image.convert("L").resize((_HASH_SIZE, _HASH_SIZE), Image.LANCZOS), dtype=np.float64)
+
+    dct = _dct_matrix(_HASH_SIZE)
+    low = (dct @ pixels @ dct.T)[:_HASH_BITS_SIZE, :_HASH_BITS_SIZE].flatten()
+    # The first coefficient is the average brightness, it would dominate the median
+    bits = low > np.median(low[1:])
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hash_distance(first: int, second: int) -> int:
+    """
+    Counts the differing bits of two perceptual hashes.
+
+    Args:
+        first (int): The first hash.
+        second (int): The second hash.
+
+    Returns:
+        distance (int): The Hamming distance, 0 for the same image and around 32 for unrelated ones.
+    """
+    return bin(first ^ second).count("1")
+
+
+def _signed(phash: int) -> int:
+    # SQLite integers are signed 64-bit, hashes are stored as such
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+def _unsigned(stored: int) -> int:
+    return stored & 0xFFFFFFFFFFFFFFFF
+
+
+class ImageLibrary:
+    """
+    Store of the generated images under `cache/images`, searched by prompt similarity so that images can be
+    reused by later videos with close prompts.
+
+    Near-duplicates of a stored image (by perceptual hash) are not stored again, the least recently used images
+    are evicted once the library grows over its size limit.
+    """
+
+    def __init__(self, directory: str, max_size_bytes: int, duplicate_distance: int) -> None:
+        """
+        Opens the library, creating it if needed.
+
+        Args:
+            directory (str): The folder holding the images and their index.
+            max_size_bytes (int): The size above which the least recently used images are evicted.
+            duplicate_distance (int): The maximum hash distance between two images considered the same.
+
+        Returns:
+            None
+        """
+        self._directory = directory
+        self._max_size_bytes = max_size_bytes
+        self._duplicate_distance = duplicate_distance
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(directory, "library.db"), timeout=30,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    phash INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS images_prompt ON images (prompt);
+                CREATE INDEX IF NOT EXISTS images_used_at ON images (used_at);
+            """)
+
+        self._index = TopicIndex()
+        self._prompts: Set[str] = set()
+        self._hashes: Dict[int, int] = {}
+        # The ID of the last image indexed, the images added by other processes have higher IDs
+        self._indexed_id = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        Rebuilds the prompt and hash indexes from the stored images. Must be called with the lock held, or before
+        the library is shared.
+
+        Returns:
+            None
+        """
+        self._index = TopicIndex()
+        self._prompts = set()
+        self._hashes = {}
+        self._indexed_id = 0
+        self._update_index()
+
+    def _update_index(self) -> None:
+        """
+        Indexes the images stored since the last update, by this process or others. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        rows = self._connection.execute("SELECT id, prompt, phash FROM images WHERE id > ? ORDER BY id",
+                                        (self._indexed_id,)).fetchall()
+        for image_id, prompt, phash in rows:
+            if prompt not in self._prompts:
+                self._prompts.add(prompt)
+                self._index.add(prompt)
+            self._hashes[image_id] = _unsigned(phash)
+            self._indexed_id = image_id
+
+    def _forget(self, image_id: int) -> None:
+        # The file was removed by another process, e.g. on eviction
+        with self._connection:
+            self._connection.execute("DELETE FROM images WHERE id = ?", (image_id,))
+        self._hashes.pop(image_id, None)
+
+    def find_duplicate(self, phash: int) -> Optional[int]:
+        """
+        Finds a stored image which looks the same as an image.
+
+        Args:
+            phash (int): The perceptual hash of the image.
+
+        Returns:
+            id (int): The ID of the stored image, None if there is none.
+        """
+        with self._lock:
+            self._update_index()
+            for image_id, stored in list(self._hashes.items()):
+                if hash_distance(phash, stored) > self._duplicate_distance:
+                    continue
+                # Another process may have evicted it
+                if self._connection.execute("SELECT 1 FROM images WHERE id = ?", (image_id,)).fetchone() is None:
+                    del self._hashes[image_id]
+                    continue
+                return image_id
+        return None
+
+    def add(self, prompt: str, image_path: str) -> Optional[str]:
+        """
+        Stores a copy of a generated image, unless the library already holds the same image.
+
+        Args:
+            prompt (str): The prompt the image was generated from.
+            image_path (str): The path to the image.
+
+        Returns:
+            path (str): The path to the stored copy, None if it was a duplicate.
+        """
+        phash = perceptual_hash(image_path)
+        if self.find_duplicate(phash) is not None:
+            return None
+
+        path = os.path.join(self._directory, str(uuid4()) + os.path.splitext(image_path)[1])
+        shutil.copyfile(image_path, path)
+        size = os.path.getsize(path)
+        now = time.time()
+
+        with self._lock:
+            with self._connection:
+                cursor = self._connection.execute(
+                    "INSERT INTO images (prompt, path, phash, size, created_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (prompt, path, _signed(phash), size, now, now))
+            self._update_index()
+            self._evict()
+
+        return path
+
+    def find(self, prompt: str, threshold: float, destination: str,
+             exclude: Optional[List[int]] = None) -> Optional[str]:
+        """
+        Copies a stored image generated from a prompt similar to a prompt.
+
+        Args:
+            prompt (str): The prompt of the image to generate.
+            threshold (float): The similarity (between 0 and 1) above which an image is reused.
+            destination (str): The folder to copy the image to.
+            exclude (List[int], optional): The hashes of images which must not be returned, e.g. the images already
+                used in the same video.
+
+        Returns:
+            path (str): The path to the copy of the stored image, None if no stored prompt is similar enough.
+        """
+        with self._lock:
+            self._update_index()
+            matches = self._index.nearest(prompt, k=5)
+
+        for score, text in matches:
+            if score < threshold:
+                break
+
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT id, path, phash FROM images WHERE prompt = ? ORDER BY used_at DESC", (text,)).fetchall()
+                for image_id, path, phash in rows:
+                    if any(hash_distance(_unsigned(phash), used) <= self._duplicate_distance
+                           for used in exclude or []):
+                        continue
+
+                    # Copied under the lock so this process doesn't evict it meanwhile, other processes may
+                    image_path = os.path.join(destination, str(uuid4()) + os.path.splitext(path)[1])
+                    try:
+                        shutil.copyfile(path, image_path)
+                    except FileNotFoundError:
+                        self._forget(image_id)
+                        continue
+
+                    with self._connection:
+                        self._connection.execute("UPDATE images SET used_at = ? WHERE id = ?", (time.time(), image_id))
+                    if get_verbose():
+                        info(f" => Reusing Image \"{path}\" of Prompt: {text} ({score:.2f} similar)")
+                    return image_path
+
+        return None
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used images until the library fits its size limit. Must be called with the lock
+        held.
+
+        Returns:
+            None
+        """
+        size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        if size <= self._max_size_bytes:
+            return
+
+        rows = self._connection.execute("SELECT id, path, size FROM images ORDER BY used_at").fetchall()
+        with self._connection:
+            for image_id, path, image_size in rows:
+                if size <= self._max_size_bytes:
+                    break
+                self._connection.execute("DELETE FROM images WHERE id = ?", (image_id,))
+                if os.path.exists(path):
+                    os.remove(path)
+                size -= image_size
+
+        # The prompts of the evicted images must not be found anymore
+        self._load_index()
+
+
+_library: Optional[ImageLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_image_library() -> Optional[ImageLibrary]:
+    """
+    Gets the library of generated images.
+
+    Returns:
+        library (ImageLibrary): The image library, None if disabled in the config.
+    """
+    global _library
+
+    config = get_settings().image_reuse
+    if not config.enabled:
+        return None
+
+    with _library_lock:
+        if _library is None:
+            _library = ImageLibrary(os.path.join(get_cache_dir(), "images"), config.max_size_bytes,
+                                    config.duplicate_distance)
+        return _library
@@ -0,0 +1,291 @@
+import os
+import shutil
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+from PIL import Image
+
+from src.utils.config import get_image_concurrency, get_settings, get_verbose
+from src.utils.http_client import download, get_json
+from src.utils.resources import resource
+from src.utils.status import info, warning
+from src.utils.topic_index import TopicIndex
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Size of the placeholder images, the size of the video
+PLACEHOLDER_SIZE = (1080, 1920)
+
+
+class ImageProvider:
+    """
+    Backend generating an image for a prompt, selected by the `image_model` of a generator.
+    """
+
+    name = ""
+
+    def generate(self, prompt: str, generation_path: str) -> str:
+        """
+        Generates an image for a prompt.
+
+        Args:
+            prompt (str): Reference for image generation
+            generation_path (str): The folder to write the image to
+
+        Returns:
+            path (str): The path to the generated image.
+        """
+        raise NotImplementedError
+
+
+class HttpImageProvider(ImageProvider):
+    """
+    Generates images with a model of the image generation API (`image_api_url`).
+    """
+
+    def __init__(self, image_model: str) -> None:
+        self.name = image_model
+        # Shared by every generator of the process
+        self._semaphore = threading.Semaphore(get_image_concurrency(image_model))
+
+    def generate(self, prompt: str, generation_path: str) -> str:
+        with self._semaphore, resource("image"):
+            url = get_settings().image_api_url.format(model=self.name)
+            parsed = get_json(url, params={"prompt": prompt})
+
+            image_url = parsed.get("url") if isinstance(parsed, dict) else None
+            if not image_url:
+                raise ValueError(f"No image in the response for Prompt: {prompt}")
+
+            return download(image_url, os.path.join(generation_path, str(uuid4()) + ".png"))
+
+
+class LibraryImageProvider(ImageProvider):
+    """
+    Picks the image of a local folder (`image_library_dir`) whose description is the closest to the prompt.
+
+    The description of an image is its file name, with `_` and `-` as spaces, followed by the content of the
+    text file with the same name if any (e.g. `sunset_beach.jpg` and `sunset_beach.txt`).
+    """
+
+    name = "library"
+
+    def __init__(self, directory: str, threshold: float) -> None:
+        self._directory = directory
+        self._threshold = threshold
+        self._index = TopicIndex()
+        self._paths: Dict[str, List[str]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """
+        Indexes the folder again if it changed since it was last indexed.
+
+        Returns:
+            None
+        """
+        mtime = os.stat(self._directory).st_mtime if os.path.isdir(self._directory) else None
+        with self._lock:
+            if mtime == self._mtime and self._mtime is not None:
+                return
+
+            index = TopicIndex()
+            paths: Dict[str, List[str]] = {}
+            for name in sorted(os.listdir(self._directory)) if mtime is not None else []:
+                stem, extension = os.path.splitext(name)
+                if extension.lower() not in IMAGE_EXTENSIONS:
+                    continue
+
+                description = stem.replace("_", " ").replace("-", " ")
+                text_path = os.path.join(self._directory, stem + ".txt")
+                if os.path.exists(text_path):
+                    with open(text_path, "r", encoding="utf-8") as file:
+                        description += " " + file.read().strip()
+
+                if description not in paths:
+                    index.add(description)
+                paths.setdefault(description, []).append(os.path.join(self._directory, name))
+
+            self._index, self._paths, self._mtime = index, paths, mtime
+
+            if get_verbose():
+                info(f" => Indexed {sum(len(p) for p in paths.values())} images of \"{self._directory}\"")
+
+    def generate(self, prompt: str, generation_path: str) -> str:
+        self._refresh()
+        matches = self._index.nearest(prompt)
+        if not matches or matches[0][0] < self._threshold:
+            # Not a failure of the backend, see `generate_with_failover`
+            raise LookupError(f"No image of the library matches Prompt: {prompt}")
+
+        source = self._paths[matches[0][1]][0]
+        image_path = os.path.join(generation_path, str(uuid4()) + os.path.splitext(source)[1])
+        shutil.copyfile(source, image_path)
+        return image_path
+
+
+class PlaceholderImageProvider(ImageProvider):
+    """
+    Draws a gradient whose colors are derived from the prompt, without any network request. Meant for tests.
+    """
+
+    name = "placeholder"
+
+    def generate(self, prompt: str, generation_path: str) -> str:
+        rng = np.random.default_rng(zlib.crc32(prompt.encode("utf-8")))
+        top, bottom = rng.integers(0, 256, size=(2, 3))
+
+        width, height = PLACEHOLDER_SIZE
+        weights = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+        column = (top * (1 - weights) + bottom * weights).astype(np.uint8)
+        pixels = np.broadcast_to(column[:, None, :], (height, width, 3))
+
+        image_path = os.path.join(generation_path, str(uuid4()) + ".png")
+        Image.fromarray(np.ascontiguousarray(pixels)).save(image_path)
+        return image_path
+
+
+_factories: Dict[str, Callable[[], ImageProvider]] = {
+    "library": lambda: LibraryImageProvider(get_settings().image_library_dir, get_settings().image_library_threshold),
+    "placeholder": PlaceholderImageProvider
+}
+_providers: Dict[str, ImageProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def register_image_provider(name: str, factory: Callable[[], ImageProvider]) -> None:
+    """
+    Registers an image backend, selected by generators whose `image_model` or `image_fallbacks` contain its name.
+
+    Args:
+        name (str): The name of the backend.
+        factory (Callable): Creates the backend, called once per process.
+
+    Returns:
+        None
+    """
+    with _providers_lock:
+        _factories[name] = factory
+        _providers.pop(name, None)
+
+
+def get_image_provider(name: str) -> ImageProvider:
+    """
+    Gets an image backend by name, names which are not registered are models of the image generation API.
+
+    Args:
+        name (str): The name of the backend or image model.
+
+    Returns:
+        provider (ImageProvider): The backend, shared by every generator of the process.
+    """
+    with _providers_lock:
+        if name not in _providers:
+            factory = _factories.get(name)
+            _providers[name] = factory() if factory is not None else HttpImageProvider(name)
+        return _providers[name]
+
+
+class ProviderStats:
+    """
+    Latency and health of an image backend.
+    """
+
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            # Exponentially weighted, recent requests weigh more
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+            self.failures = 0
+            self.unavailable_until = 0.0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            # Skip the backend for a while, longer after each consecutive failure
+            self.unavailable_until = time.time() + min(300.0, 5.0 * 2 ** self.failures)
+
+
+_stats: Dict[str, ProviderStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    """
+    Gets the latency and health of an image backend, shared by every generator of the process.
+
+    Args:
+        name (str): The name of the backend.
+
+    Returns:
+        stats (ProviderStats): The stats of the backend.
+    """
+    with _stats_lock:
+        return _stats.setdefault(name, ProviderStats())
+
+
+def route(names: List[str]) -> List[str]:
+    """
+    Orders backends by preference: the configured order, moving the ones which recently failed and the ones
+    slower than `image_provider_slow_seconds` behind the others.
+
+    Args:
+        names (List[str]): The backends, most preferred first.
+
+    Returns:
+        names (List[str]): The backends in the order they should be tried.
+    """
+    now = time.time()
+    slow_seconds = get_settings().image_provider_slow_seconds
+
+    def key(item):
+        index, name = item
+        stats = get_provider_stats(name)
+        return stats.unavailable_until > now, stats.latency is not None and stats.latency > slow_seconds, index
+
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+
+def generate_with_failover(prompt: str, names: List[str], generation_path: str) -> Tuple[str, str]:
+    """
+    Generates an image with the first backend which succeeds, in routing order.
+
+    Args:
+        prompt (str): Reference for image generation
+        names (List[str]): The backends, most preferred first.
+        generation_path (str): The folder to write the image to
+
+    Returns:
+        path (str): The path to the generated image.
+        name (str): The backend which generated the image.
+    """
+    last_error: Optional[Exception] = None
+    for name in route(names):
+        stats = get_provider_stats(name)
+        start = time.perf_counter()
+        try:
+            image_path = get_image_provider(name).generate(prompt, generation_path)
+        except LookupError as e:
+            # The backend works but has no image for this prompt
+            last_error = e
+            continue
+        except Exception as e:
+            stats.record_failure()
+            warning(f" => Image backend \"{name}\" failed for Prompt: {prompt} ({str(e)})")
+            last_error = e
+            continue
+
+        stats.record_success(time.perf_counter() - start)
+        return image_path, name
+
+    raise last_error
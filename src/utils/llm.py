@@ -1,8 +1,51 @@
-import g4f
+import os
+import threading
+from typing import Any, Callable, List, Optional
 
-from utils.status import error
+from src.utils.cache import DiskCache
+from src.utils.config import get_settings, get_cache_dir
+from src.utils.llm_providers import LLMProvider, get_llm_providers, hedged_complete
+from utils.status import error, warning
 
-def generate_response(prompt: str, model: any, max_retry = 10) -> str:
+_response_cache: Optional[DiskCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[DiskCache]:
+    """
+    Gets the on-disk cache of LLM responses.
+
+    Returns:
+        cache (DiskCache): The response cache, None if disabled in the config.
+    """
+    global _response_cache
+
+    config = get_settings().llm_cache
+    if not config.enabled:
+        return None
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = DiskCache(os.path.join(get_cache_dir(), "llm"), config.max_size_bytes,
+                                        config.ttl_seconds)
+        return _response_cache
+
+
+def _is_valid(response: str, validate: Optional[Callable[[str], Any]]) -> bool:
+    if validate is None:
+        return True
+
+    try:
+        validate(response)
+        return True
+    except Exception as e:
+        warning(f"Unusable response ({str(e)}), generating a new one...")
+        return False
+
+
+def generate_response(prompt: str, model: any, max_retry = 10, use_cache: bool = True,
+                      providers: Optional[List[LLMProvider]] = None,
+                      validate: Optional[Callable[[str], Any]] = None) -> str:
     """
     Generates an LLM Response based on a prompt and the user-provided model.
 
@@ -10,10 +53,24 @@ def generate_response(prompt: str, model: any, max_retry = 10) -> str:
         prompt (str): The prompt to use in the text generation.
         model (any): The model to use for the generation.
         max_retry (int): The maximum amount of retries to generate the response.
+        use_cache (bool): Whether to reuse a cached response, disable for prompts expected to give a new answer each time.
+        providers (List[LLMProvider], optional): The providers to ask, the g4f providers of the model if omitted.
+        validate (Callable, optional): Raises if a response can't be used by the caller. Such a response is neither
+            cached nor returned, a new one is generated instead.
 
     Returns:
         response (str): The generated AI Response.
     """
+    cache = get_response_cache() if use_cache else None
+    key = DiskCache.make_key(getattr(model, "name", str(model)), prompt)
+
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None and _is_valid(cached.decode("utf-8"), validate):
+            return cached.decode("utf-8")
+
+    if providers is None:
+        providers = get_llm_providers(model)
 
     response = ""
     retry = 0
@@ -21,14 +78,15 @@ def generate_response(prompt: str, model: any, max_retry = 10) -> str:
         if retry > max_retry:
             error("Failed to generate response.")
             return ""
-        response = g4f.ChatCompletion.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
+        try:
+            response = hedged_complete(prompt, providers)
+        except Exception as e:
+            warning(f"Failed to generate response ({str(e)}), retrying...")
+        if response and not _is_valid(response, validate):
+            response = ""
         retry += 1
+
+    if cache is not None:
+        cache.put(key, response.encode("utf-8"))
+
     return response
@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import g4f
+import numpy as np
+
+from src.utils.config import LlmConfig, get_settings, get_verbose
+from src.utils.metrics import record_timing
+from src.utils.resources import acquire_resource, release_resource
+from src.utils.status import info, warning
+
+# Amount of recent latencies kept per provider
+_LATENCY_WINDOW = 50
+
+# Latencies needed before the percentile of a provider is trusted
+_MIN_LATENCY_SAMPLES = 5
+
+# Delay before trying again to hedge a request while every `llm` slot is used
+_HEDGE_RETRY_SECONDS = 0.1
+
+
+class LLMProvider:
+    """
+    Backend answering prompts for a model.
+    """
+
+    name = ""
+
+    def complete(self, prompt: str, timeout: float) -> str:
+        """
+        Answers a prompt.
+
+        Args:
+            prompt (str): The prompt.
+            timeout (float): The time after which the provider should give up, in seconds.
+
+        Returns:
+            response (str): The answer.
+        """
+        raise NotImplementedError
+
+
+class G4fProvider(LLMProvider):
+    """
+    A g4f provider of a model, or the provider g4f picks if `provider` is None.
+    """
+
+    def __init__(self, model: Any, provider: Any = None) -> None:
+        self._model = model
+        self._provider = provider
+        self.name = getattr(provider, "__name__", "g4f")
+
+    def complete(self, prompt: str, timeout: float) -> str:
+        return g4f.ChatCompletion.create(
+            model=self._model,
+            provider=self._provider,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            timeout=timeout
+        )
+
+
+def get_llm_providers(model: Any) -> List[LLMProvider]:
+    """
+    Lists the working g4f providers of a model.
+
+    Args:
+        model (any): The g4f model, as returned by `parse_model`.
+
+    Returns:
+        providers (List[LLMProvider]): The providers, a single one letting g4f pick if the model lists none.
+    """
+    best_provider = getattr(model, "best_provider", None)
+    candidates = getattr(best_provider, "providers", None) or ([best_provider] if best_provider else [])
+    providers = [G4fProvider(model, provider) for provider in candidates if getattr(provider, "working", True)]
+    return providers or [G4fProvider(model)]
+
+
+class ProviderHealth:
+    """
+    Recent latencies and failures of a provider.
+    """
+
+    def __init__(self) -> None:
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.failures = 0
+        self.unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            self.failures = 0
+            self.unavailable_until = 0.0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            # Route around the provider for a while, longer after each consecutive failure
+            self.unavailable_until = time.time() + min(600.0, 10.0 * 2 ** self.failures)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        Gets a percentile of the recent latencies.
+
+        Args:
+            percentile (float): The percentile, between 0 and 100.
+
+        Returns:
+            latency (float): The latency in seconds, None until enough requests were answered.
+        """
+        with self._lock:
+            if len(self._latencies) < _MIN_LATENCY_SAMPLES:
+                return None
+            return float(np.percentile(self._latencies, percentile))
+
+
+_health: Dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+
+
+def get_provider_health(name: str) -> ProviderHealth:
+    """
+    Gets the health of a provider, shared by every generator of the process.
+
+    Args:
+        name (str): The name of the provider.
+
+    Returns:
+        health (ProviderHealth): The health of the provider.
+    """
+    with _health_lock:
+        return _health.setdefault(name, ProviderHealth())
+
+
+def rank_providers(providers: List[LLMProvider]) -> List[LLMProvider]:
+    """
+    Orders providers by health: available ones first, then by median latency, untried ones being tried early.
+
+    Args:
+        providers (List[LLMProvider]): The providers of a model.
+
+    Returns:
+        providers (List[LLMProvider]): The providers in the order they should be tried.
+    """
+    now = time.time()
+
+    def key(item: Tuple[int, LLMProvider]):
+        index, provider = item
+        health = get_provider_health(provider.name)
+        return health.unavailable_until > now, health.latency_percentile(50) or 0.0, index
+
+    return [provider for _, provider in sorted(enumerate(providers), key=key)]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # Calls which timed out keep their thread until the provider gives up
+            _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+        return _executor
+
+
+def _hedge_delay(provider: LLMProvider, config: LlmConfig) -> float:
+    latency = get_provider_health(provider.name).latency_percentile(config.hedge_percentile)
+    return latency if latency is not None else config.hedge_after_seconds
+
+
+def hedged_complete(prompt: str, providers: List[LLMProvider], config: Optional[LlmConfig] = None) -> str:
+    """
+    Answers a prompt with the first provider giving a non-empty answer.
+
+    The best ranked provider is asked first. If it has not answered once its usual latency (`hedge_percentile`) has
+    passed, the next provider is asked as well, up to `max_in_flight` providers at a time. A provider failing or
+    exceeding `timeout_seconds` is replaced by the next one right away.
+
+    Each call holds a slot of the `llm` resource while it is awaited, hedging calls are only made with a free slot.
+
+    Args:
+        prompt (str): The prompt.
+        providers (List[LLMProvider]): The providers able to answer.
+        config (LlmConfig, optional): The timeouts and hedging settings, from the config file if omitted.
+
+    Returns:
+        response (str): The first valid answer.
+    """
+    config = config or get_settings().llm
+    queue = rank_providers(providers)
+    pending: Dict[Future, Tuple[LLMProvider, float]] = {}
+    last_error: Optional[Exception] = None
+    # The failed and timed out calls, replaced without waiting for the hedging delay
+    replacements = 0
+    hedge_at = 0.0
+
+    def launch() -> bool:
+        nonlocal hedge_at
+        # The first call waits for a slot, the others are only made if one is free
+        if not acquire_resource("llm", blocking=not pending):
+            return False
+        provider = queue.pop(0)
+        if pending and get_verbose():
+            info(f" => Hedging LLM request with provider {provider.name}")
+        # The time spent waiting for the slot doesn't count towards the timeout
+        started = time.perf_counter()
+        pending[_get_executor().submit(provider.complete, prompt, config.timeout_seconds)] = (provider, started)
+        hedge_at = started + _hedge_delay(provider, config)
+        return True
+
+    def stop_waiting(future: Future) -> Tuple[LLMProvider, float]:
+        # The slot is freed even if the call keeps running in the background
+        release_resource("llm")
+        return pending.pop(future)
+
+    try:
+        launch()
+        while pending:
+            now = time.perf_counter()
+            deadlines = [started + config.timeout_seconds for _, started in pending.values()]
+            if queue and len(pending) < config.max_in_flight:
+                deadlines.append(hedge_at)
+            done, _ = wait(list(pending), timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider, started = stop_waiting(future)
+                latency = time.perf_counter() - started
+                try:
+                    response = future.result()
+                    if not isinstance(response, str) or not response.strip():
+                        raise ValueError("empty response")
+                except Exception as e:
+                    get_provider_health(provider.name).record_failure()
+                    warning(f" => LLM provider {provider.name} failed after {latency:.1f}s ({str(e)})")
+                    last_error = e
+                    replacements += 1
+                    continue
+
+                get_provider_health(provider.name).record_success(latency)
+                record_timing(f"llm {provider.name}", latency)
+                if get_verbose():
+                    info(f" => LLM provider {provider.name} answered in {latency:.1f}s")
+                # The slower calls are left to finish in the background, their answers are dropped
+                return response
+
+            now = time.perf_counter()
+            for future, (provider, started) in list(pending.items()):
+                if now - started >= config.timeout_seconds:
+                    stop_waiting(future)
+                    future.cancel()
+                    get_provider_health(provider.name).record_failure()
+                    warning(f" => LLM provider {provider.name} timed out after {config.timeout_seconds:g}s")
+                    last_error = TimeoutError(f"{provider.name} timed out")
+                    replacements += 1
+
+            # Replace the failed calls, and hedge the slow ones
+            while queue and len(pending) < config.max_in_flight and (replacements or not pending or now >= hedge_at):
+                if not launch():
+                    # Every slot is used by other requests, try again shortly
+                    hedge_at = now + _HEDGE_RETRY_SECONDS
+                    break
+                replacements = max(0, replacements - 1)
+    finally:
+        for future in list(pending):
+            stop_waiting(future)
+
+    raise last_error if last_error is not None else RuntimeError("No LLM provider available")
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from prettytable import PrettyTable
+
+_timings: Dict[str, List[float]] = defaultdict(list)
+_timings_lock = threading.Lock()
+
+
+def record_timing(stage: str, seconds: float) -> None:
+    """
+    Records the duration of a stage.
+
+    Args:
+        stage (str): The name of the stage.
+        seconds (float): The duration of the stage.
+
+    Returns:
+        None
+    """
+    with _timings_lock:
+        _timings[stage].append(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Records the duration of the enclosed block, even if it fails.
+
+    Args:
+        stage (str): The name of the stage.
+
+    Returns:
+        None
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - start)
+
+
+def timed_stage(stage: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps a stage so that each of its runs is recorded.
+
+    Args:
+        stage (str): The name of the stage.
+        func (Callable): The stage, called with keyword arguments.
+
+    Returns:
+        wrapped (Callable): The timed stage.
+    """
+    def run(**kwargs) -> Any:
+        with timed(stage):
+            return func(**kwargs)
+
+    return run
+
+
+def reset_timings() -> None:
+    """
+    Forgets the recorded durations, at the beginning of a batch.
+
+    Returns:
+        None
+    """
+    with _timings_lock:
+        _timings.clear()
+
+
+def timings_table() -> PrettyTable:
+    """
+    Summarizes the recorded durations per stage.
+
+    Returns:
+        table (PrettyTable): The run count, total, mean and max duration of each stage.
+    """
+    table = PrettyTable(["Stage", "Runs", "Total (s)", "Mean (s)", "Max (s)"])
+    with _timings_lock:
+        for stage, durations in _timings.items():
+            table.add_row([stage, len(durations), f"{sum(durations):.1f}", f"{sum(durations) / len(durations):.1f}",
+                           f"{max(durations):.1f}"])
+
+    return table
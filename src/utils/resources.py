@@ -0,0 +1,67 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from src.utils.config import get_settings
+
+# Amount of concurrent users of each shared resource, unless overridden by `resource_limits` in the config
+DEFAULT_RESOURCE_LIMITS = {
+    "llm": 4,
+    "image": 8,
+    "tts": 1,
+    "encoder": 1,
+    "browser": 1
+}
+
+_semaphores: Dict[str, threading.Semaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def _get_semaphore(name: str) -> threading.Semaphore:
+    with _semaphores_lock:
+        if name not in _semaphores:
+            limit = get_settings().resource_limits.get(name, DEFAULT_RESOURCE_LIMITS.get(name, 1))
+            _semaphores[name] = threading.Semaphore(max(1, limit))
+        return _semaphores[name]
+
+
+def acquire_resource(name: str, blocking: bool = True) -> bool:
+    """
+    Takes one slot of a shared resource, for users which can't hold it in a `with resource(...)` block.
+
+    Args:
+        name (str): The resource, `llm`, `image`, `tts`, `encoder` or `browser`.
+        blocking (bool): Whether to wait while all of its slots are used, rather than giving up.
+
+    Returns:
+        acquired (bool): Whether the slot was taken, to be freed with `release_resource`.
+    """
+    return _get_semaphore(name).acquire(blocking)
+
+
+def release_resource(name: str) -> None:
+    """
+    Frees a slot taken with `acquire_resource`.
+
+    Args:
+        name (str): The resource.
+
+    Returns:
+        None
+    """
+    _get_semaphore(name).release()
+
+
+@contextmanager
+def resource(name: str):
+    """
+    Holds one slot of a shared resource, waiting while all of its slots are used by other generators.
+
+    Args:
+        name (str): The resource, `llm`, `image`, `tts`, `encoder` or `browser`.
+
+    Returns:
+        None
+    """
+    with _get_semaphore(name):
+        yield
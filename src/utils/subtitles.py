@@ -0,0 +1,135 @@
+import math
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Width of the video, subtitles are wrapped to fit it
+VIDEO_WIDTH = 1080
+
+_SRT_TIME = r"(\d+):(\d+):(\d+)[,.](\d+)"
+
+
+def _parse_srt_time(hours: str, minutes: str, seconds: str, millis: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def _format_srt_time(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d},{millis % 1000:03d}"
+
+
+def write_subtitles(cues: List[Tuple[float, float, str]], srt_path: str) -> str:
+    """
+    Writes cues to a SRT file.
+
+    Args:
+        cues (List[Tuple[float, float, str]]): The start time, end time and text of each cue.
+        srt_path (str): The path to the SRT file.
+
+    Returns:
+        path (str): The path to the SRT file.
+    """
+    with open(srt_path, "w", encoding="utf-8") as file:
+        for i, (start, end, text) in enumerate(cues, start=1):
+            file.write(f"{i}\n{_format_srt_time(start)} --> {_format_srt_time(end)}\n{text}\n\n")
+
+    return srt_path
+
+
+def load_subtitles(srt_path: str) -> List[Tuple[float, float, str]]:
+    """
+    Reads the cues of a SRT file.
+
+    Args:
+        srt_path (str): The path to the SRT file.
+
+    Returns:
+        cues (List[Tuple[float, float, str]]): The start time, end time and text of each cue.
+    """
+    with open(srt_path, "r", encoding="utf-8") as file:
+        blocks = re.split(r"\n\s*\n", file.read().replace("\r\n", "\n"))
+
+    cues = []
+    for block in blocks:
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            times = re.findall(_SRT_TIME, line)
+            if len(times) == 2:
+                text = "\n".join(lines[i + 1:]).strip()
+                if text:
+                    cues.append((_parse_srt_time(*times[0]), _parse_srt_time(*times[1]), text))
+                break
+
+    return cues
+
+
+@lru_cache(maxsize=16)
+def _load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size)
+
+
+def _wrap(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
+    """
+    Wraps a text on as many lines as needed to fit a width.
+
+    Args:
+        text (str): The text to wrap.
+        font (ImageFont.FreeTypeFont): The font of the text.
+        max_width (int): The maximum width of a line, in pixels.
+
+    Returns:
+        text (str): The wrapped text.
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and font.getlength(candidate) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=512)
+def render_subtitle(text: str, font_path: str, size: int, color: str, stroke_color: str, stroke_width: int,
+                    max_width: int = VIDEO_WIDTH) -> np.ndarray:
+    """
+    Rasterizes a subtitle once, cropped to the bounding box of the text. Identical subtitles are served from
+    the cache.
+
+    Args:
+        text (str): The text of the subtitle.
+        font_path (str): The path to the font.
+        size (int): The font size.
+        color (str): The color of the text.
+        stroke_color (str): The color of the outline.
+        stroke_width (int): The thickness of the outline.
+        max_width (int): The width the text is wrapped to.
+
+    Returns:
+        sprite (np.ndarray): The read-only RGBA image of the subtitle.
+    """
+    font = _load_font(font_path, size)
+    text = _wrap(text, font, max_width)
+
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox((0, 0), text, font=font, align="center",
+                                                          stroke_width=stroke_width)
+
+    left, top, right, bottom = math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+
+    image = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-left, -top), text, font=font, fill=color, align="center",
+                                         stroke_width=stroke_width, stroke_fill=stroke_color)
+
+    sprite = np.asarray(image)
+    sprite.setflags(write=False)
+    return sprite
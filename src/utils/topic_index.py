@@ -0,0 +1,96 @@
+import re
+import threading
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+DIMENSIONS = 1024
+
+
+def vectorize(text: str, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """
+    Embeds a text as a normalized vector of hashed words and character trigrams.
+
+    Args:
+        text (str): The text to embed.
+        dimensions (int): The size of the vector.
+
+    Returns:
+        vector (np.ndarray): The unit-length embedding, zero if the text has no words.
+    """
+    words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        # crc32 is stable across runs, unlike hash()
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class TopicIndex:
+    """
+    In-memory similarity index over texts, searched with a single matrix product.
+    """
+
+    def __init__(self, dimensions: int = DIMENSIONS) -> None:
+        self._dimensions = dimensions
+        self._vectors = np.zeros((64, dimensions), dtype=np.float32)
+        self._texts: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, text: str) -> None:
+        """
+        Adds a text to the index.
+
+        Args:
+            text (str): The text to add.
+
+        Returns:
+            None
+        """
+        vector = vectorize(text, self._dimensions)
+
+        with self._lock:
+            if len(self._texts) == len(self._vectors):
+                # Grow by doubling, appends stay amortized constant time
+                self._vectors = np.vstack([self._vectors, np.zeros_like(self._vectors)])
+            self._vectors[len(self._texts)] = vector
+            self._texts.append(text)
+
+    def nearest(self, text: str, k: int = 1) -> List[Tuple[float, str]]:
+        """
+        Finds the indexed texts most similar to a text.
+
+        Args:
+            text (str): The text to search for.
+            k (int): The maximum amount of results.
+
+        Returns:
+            matches (List[Tuple[float, str]]): The cosine similarity and text of the closest matches, best first.
+        """
+        vector = vectorize(text, self._dimensions)
+
+        with self._lock:
+            count = len(self._texts)
+            if count == 0:
+                return []
+            scores = self._vectors[:count] @ vector
+            texts = list(self._texts)
+
+        k = min(k, count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        return [(float(scores[i]), texts[i]) for i in best]
@@ -1,9 +1,93 @@
+import multiprocessing
 import os
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
+import numpy as np
+import pysbd
 from TTS.utils.manage import ModelManager
 from TTS.utils.synthesizer import Synthesizer
 
-from src.utils.config import ROOT_DIR
+from src.utils.cache import DiskCache
+from src.utils.config import ROOT_DIR, get_cache_dir, get_settings, get_verbose
+from src.utils.resources import resource
+from src.utils.status import info
+
+# Silence appended by `Synthesizer.tts` after each sentence, in samples
+SENTENCE_PAUSE_SAMPLES = 10000
+
+TTS_MODEL = "tts_models/en/ljspeech/tacotron2-DDC_ph"
+VOCODER_MODEL = "vocoder_models/en/ljspeech/univnet"
+
+_speech_cache: Optional[DiskCache] = None
+_speech_cache_lock = threading.Lock()
+
+
+def get_speech_cache() -> Optional[DiskCache]:
+    """
+    Gets the on-disk cache of synthesized sentences.
+
+    Returns:
+        cache (DiskCache): The speech cache, None if disabled in the config.
+    """
+    global _speech_cache
+
+    config = get_settings().tts_cache
+    if not config.enabled:
+        return None
+
+    with _speech_cache_lock:
+        if _speech_cache is None:
+            _speech_cache = DiskCache(os.path.join(get_cache_dir(), "tts"), config.max_size_bytes,
+                                      config.ttl_seconds)
+        return _speech_cache
+
+
+def _speech_key(sentence: str) -> str:
+    # The speech only depends on the words and the models, not on the spacing
+    return DiskCache.make_key(" ".join(sentence.split()), TTS_MODEL, VOCODER_MODEL)
+
+
+def get_cached_speech(sentence: str) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Gets the speech of a sentence from the cache.
+
+    Args:
+        sentence (str): The sentence.
+
+    Returns:
+        speech (Tuple[np.ndarray, int]): The samples, ending with the pause after the sentence, and their sample
+            rate. None if not cached.
+    """
+    cache = get_speech_cache()
+    value = cache.get(_speech_key(sentence)) if cache is not None else None
+    if value is None:
+        return None
+
+    sample_rate, = struct.unpack("<I", value[:4])
+    return np.frombuffer(value[4:], dtype="<f4"), sample_rate
+
+
+def put_cached_speech(sentence: str, samples: np.ndarray, sample_rate: int) -> None:
+    """
+    Stores the speech of a sentence in the cache.
+
+    Args:
+        sentence (str): The sentence.
+        samples (np.ndarray): The samples, ending with the pause after the sentence.
+        sample_rate (int): The sample rate of the samples.
+
+    Returns:
+        None
+    """
+    cache = get_speech_cache()
+    if cache is not None:
+        cache.put(_speech_key(sentence), struct.pack("<I", sample_rate) + np.asarray(samples, dtype="<f4").tobytes())
 
 
 class TTS:
@@ -18,6 +102,8 @@ class TTS:
         Returns:
             None
         """
+        start = time.perf_counter()
+
         venv_site_packages = ".venv\\Lib\\site-packages"
 
         # Path to the .models.json file
@@ -33,11 +119,10 @@ class TTS:
 
         # Download tts_models/en/ljspeech/fast_pitch
         self._model_path, self._config_path, self._model_item = \
-            self._model_manager.download_model("tts_models/en/ljspeech/tacotron2-DDC_ph")
+            self._model_manager.download_model(TTS_MODEL)
 
         # Download vocoder_models/en/ljspeech/hifigan_v2 as our vocoder
-        voc_path, voc_config_path, _ = self._model_manager. \
-            download_model("vocoder_models/en/ljspeech/univnet")
+        voc_path, voc_config_path, _ = self._model_manager.download_model(VOCODER_MODEL)
 
         # Initialize the Synthesizer
         self._synthesizer = Synthesizer(
@@ -47,6 +132,21 @@ class TTS:
             vocoder_config=voc_config_path
         )
 
+        # The synthesizer is not thread-safe, calls are serialized
+        self._lock = threading.Lock()
+
+        self._load_time = time.perf_counter() - start
+
+    @property
+    def load_time(self) -> float:
+        """
+        Returns the time it took to load the models.
+
+        Returns:
+            float: The load time in seconds.
+        """
+        return self._load_time
+
     @property
     def synthesizer(self) -> Synthesizer:
         """
@@ -68,10 +168,200 @@ class TTS:
         Returns:
             str: The path to the output file.
         """
-        # Synthesize the text
-        outputs = self.synthesizer.tts(text)
+        self.synthesize_sentences(text, output_file)
+        return output_file
 
-        # Save the synthesized speech to the output file
-        self.synthesizer.save_wav(outputs, output_file)
+    def synthesize_sentences(self, text: str, output_file: str) -> List[Tuple[float, float, str]]:
+        """
+        Synthesizes the given text into speech one sentence at a time, recording when each sentence is spoken.
+        The speech is the same as the one of `Synthesizer.tts` on the whole text, sentences found in the speech
+        cache are not synthesized again.
 
-        return output_file
+        Args:
+            text (str): The text to synthesize.
+            output_file (str): The output file to save the synthesized speech.
+
+        Returns:
+            timings (List[Tuple[float, float, str]]): The start time, end time and text of each sentence.
+        """
+        start = time.perf_counter()
+        cache_hits = 0
+
+        with resource("tts"), self._lock:
+            sample_rate = self.synthesizer.output_sample_rate
+            chunks = []
+            length = 0
+            timings = []
+            for sentence in self.synthesizer.split_into_sentences(text):
+                if not sentence.strip():
+                    continue
+
+                cached = get_cached_speech(sentence)
+                if cached is not None and cached[1] == sample_rate:
+                    samples = cached[0]
+                    cache_hits += 1
+                else:
+                    samples = np.asarray(self.synthesizer.tts(sentence), dtype=np.float32)
+                    put_cached_speech(sentence, samples, sample_rate)
+
+                end = length + len(samples) - SENTENCE_PAUSE_SAMPLES
+                timings.append((length / sample_rate, end / sample_rate, sentence.strip()))
+                chunks.append(samples)
+                length += len(samples)
+
+            self.synthesizer.save_wav(np.concatenate(chunks), output_file)
+
+        if get_verbose():
+            info(f" => Synthesized {len(text)} characters ({len(timings)} sentences, {cache_hits} from cache) in "
+                 f"{time.perf_counter() - start:.2f}s (model load took {self.load_time:.2f}s)")
+
+        return timings
+
+
+_engine: Optional[TTS] = None
+_engine_lock = threading.Lock()
+
+
+def get_tts() -> TTS:
+    """
+    Gets the process-wide TTS engine, loading the models on first use.
+
+    Returns:
+        TTS: The shared TTS engine.
+    """
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TTS()
+
+    return _engine
+
+
+@lru_cache(maxsize=None)
+def _get_segmenter() -> pysbd.Segmenter:
+    # The segmenter used by `Synthesizer.split_into_sentences`
+    return pysbd.Segmenter(language="en", clean=True)
+
+
+def split_into_sentences(text: str) -> List[str]:
+    """
+    Splits a text into sentences like the synthesizer does, without loading the models.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        sentences (List[str]): The non-empty sentences.
+    """
+    return [sentence.strip() for sentence in _get_segmenter().segment(text) if sentence.strip()]
+
+
+def _init_worker() -> None:
+    global _engine
+    _engine = TTS()
+
+
+def _worker_load_time(_: int) -> float:
+    return get_tts().load_time
+
+
+def _synthesize_sentence(sentence: str) -> Tuple[np.ndarray, int]:
+    synthesizer = get_tts().synthesizer
+    return np.asarray(synthesizer.tts(sentence), dtype=np.float32), synthesizer.output_sample_rate
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_tts_pool() -> ProcessPoolExecutor:
+    """
+    Gets the pool of synthesis processes, each one loads the models once and keeps them for the next texts.
+
+    Returns:
+        pool (ProcessPoolExecutor): The pool of `tts_workers` processes.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=get_settings().tts_workers,
+                                        mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        return _pool
+
+
+def synthesize_parallel(text: str, output_file: str) -> List[Tuple[float, float, str]]:
+    """
+    Synthesizes the sentences of a text in the synthesis processes, then writes them to the WAV file in order.
+
+    As with `TTS.synthesize`, the speech is normalized to the loudness of its loudest sample.
+
+    Args:
+        text (str): The text to synthesize.
+        output_file (str): The output file to save the synthesized speech.
+
+    Returns:
+        timings (List[Tuple[float, float, str]]): The start time, end time and text of each sentence.
+    """
+    start = time.perf_counter()
+    sentences = split_into_sentences(text)
+    if not sentences:
+        raise ValueError("Nothing to synthesize.")
+
+    timings = []
+    chunks = []
+    written = 0
+    sample_rate = None
+    with resource("tts"):
+        # Only the sentences missing from the cache are synthesized
+        cached = [get_cached_speech(sentence) for sentence in sentences]
+        pool = get_tts_pool()
+        futures = [pool.submit(_synthesize_sentence, sentence) if speech is None else None
+                   for sentence, speech in zip(sentences, cached)]
+
+        for sentence, speech, future in zip(sentences, cached, futures):
+            if speech is None:
+                speech = future.result()
+                put_cached_speech(sentence, *speech)
+            samples, sample_rate = speech
+
+            # The samples end with the pause between sentences
+            end = written + len(samples) - SENTENCE_PAUSE_SAMPLES
+            timings.append((written / sample_rate, end / sample_rate, sentence))
+            chunks.append(samples)
+            written += len(samples)
+
+    # Same normalization as the `save_wav` of the synthesizer
+    wav = np.concatenate(chunks)
+    wav = wav * (32767 / max(0.01, np.max(np.abs(wav))))
+    with wave.open(output_file, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(wav.astype("<i2").tobytes())
+
+    if get_verbose():
+        cache_hits = sum(speech is not None for speech in cached)
+        info(f" => Synthesized {len(sentences)} sentences ({cache_hits} from cache) in "
+             f"{time.perf_counter() - start:.2f}s with {get_settings().tts_workers} workers")
+
+    return timings
+
+
+def warmup_tts() -> None:
+    """
+    Loads the TTS models ahead of the first synthesis, in each synthesis process if `tts_workers` is above 1.
+
+    Returns:
+        None
+    """
+    workers = get_settings().tts_workers
+    if workers > 1:
+        load_times = list(get_tts_pool().map(_worker_load_time, range(workers)))
+        info(f"Loaded TTS models in {workers} workers in {max(load_times):.2f}s")
+        return
+
+    engine = get_tts()
+    info(f"Loaded TTS models in {engine.load_time:.2f}s")
@@ -1,12 +1,15 @@
 import os
 import platform
 import random
+import shutil
 
 from srt_equalizer import srt_equalizer
 
 from src.utils.config import ROOT_DIR
 from src.utils.status import *
 
+UPLOADS_DIR = os.path.join(ROOT_DIR, "uploads")
+
 
 def close_running_selenium_instances() -> None:
     """
@@ -45,7 +48,7 @@ def build_url(youtube_video_id: str) -> str:
 
 def rem_temp_files() -> None:
     """
-    Removes temporary files in the `temp` directory.
+    Removes temporary files in the `temp` directory, job folders are kept to be resumed.
 
     Returns:
         None
@@ -56,7 +59,7 @@ def rem_temp_files() -> None:
     files = os.listdir(mp_dir)
 
     for file in files:
-        if not file.endswith(".json"):
+        if not file.endswith(".json") and os.path.isfile(os.path.join(mp_dir, file)):
             os.remove(os.path.join(mp_dir, file))
 
 
@@ -88,3 +91,21 @@ def equalize_subtitles(srt_path: str, max_chars: int = 10) -> None:
         None
     """
     srt_equalizer.equalize_srt_file(srt_path, srt_path, max_chars)
+
+
+def store_for_upload(video_path: str, name: str) -> str:
+    """
+    Moves a rendered video out of its job folder, so it is kept until uploaded.
+
+    Args:
+        video_path (str): The path to the rendered video.
+        name (str): The name of the stored file, without extension.
+
+    Returns:
+        path (str): The path to the stored video.
+    """
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    path = os.path.join(UPLOADS_DIR, f"{name}.mp4")
+    if os.path.abspath(video_path) != path:
+        shutil.move(video_path, path)
+    return path
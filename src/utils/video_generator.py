@@ -1,27 +1,39 @@
-from typing import List
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+import wave
+from typing import List, Tuple
 from uuid import uuid4
 
+import numpy as np
+
 import assemblyai as aai
 from moviepy.config import change_settings
 from moviepy.editor import *
-from moviepy.video.fx.all import crop
-from moviepy.video.tools.subtitles import SubtitlesClip
+from PIL import Image
 from termcolor import colored
 
 from src.utils.config import get_fonts_dir, get_assemblyai_api_key, ROOT_DIR, get_imagemagick_path, get_threads, \
     get_verbose
+from src.utils.ffmpeg_renderer import FPS, render_with_ffmpeg, render_video_segment, concat_segments, mux_audio
+from src.utils.resources import resource
+from src.utils.subtitles import load_subtitles, render_subtitle
 from src.utils.utils import choose_random_song, equalize_subtitles, info, success
 
 # Set ImageMagick Path
 change_settings({"IMAGEMAGICK_BINARY": get_imagemagick_path()})
 
+VIDEO_SIZE = (1080, 1920)
+
 
-def generate_subtitles(audio_path: str) -> str:
+def generate_subtitles(audio_path: str, srt_path: str = None) -> str:
     """
     Generates subtitles for the audio using AssemblyAI.
 
     Args:
         audio_path (str): The path to the audio file.
+        srt_path (str, optional): The path of the SRT file, a new file in `temp` if omitted.
 
     Returns:
         path (str): The path to the generated SRT File.
@@ -33,15 +45,110 @@ def generate_subtitles(audio_path: str) -> str:
     transcript = transcriber.transcribe(audio_path)
     subtitles = transcript.export_subtitles_srt()
 
-    srt_path = os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".srt")
+    if srt_path is None:
+        srt_path = os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".srt")
 
-    with open(srt_path, "w") as file:
+    with open(srt_path, "w", encoding="utf-8") as file:
         file.write(subtitles)
 
     return srt_path
 
 
-def generate_video(images, tts_path, subtitles_path, font, subtitles_max_chars, subtitles_size, subtitles_color, subtitles_stroke_color, subtitles_stroke_thickness, audio_volume) -> str:
+def get_audio_duration(wav_path: str) -> float:
+    """
+    Reads the duration of a WAV file from its header.
+
+    Args:
+        wav_path (str): The path to the WAV file
+
+    Returns:
+        duration (float): The duration in seconds
+    """
+    with wave.open(wav_path, "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def prepare_image(image_path: str) -> np.ndarray:
+    """
+    Decodes an image, center-crops it to the 9:16 aspect ratio and resizes it to 1080x1920.
+
+    Args:
+        image_path (str): The path to the image
+
+    Returns:
+        frame (np.ndarray): The RGB frame of the image
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        width, height = image.size
+
+        # Not all images are same size,
+        # so we need to crop them
+        if round(width / height, 4) < 0.5625:
+            if get_verbose():
+                info(f" => Resizing Image: {image_path} to 1080x1920")
+            crop_height = round(width / 0.5625)
+            top = (height - crop_height) / 2
+            box = (0, top, width, top + crop_height)
+        else:
+            if get_verbose():
+                info(f" => Resizing Image: {image_path} to 1920x1080")
+            crop_width = round(0.5625 * height)
+            left = (width - crop_width) / 2
+            box = (left, 0, left + crop_width, height)
+
+        return np.asarray(image.resize(VIDEO_SIZE, Image.LANCZOS, box=box))
+
+
+def subtitle_clips(cues, font_path, size, color, stroke_color, stroke_width) -> List[ImageClip]:
+    """
+    Builds one clip per subtitle cue from its pre-rendered sprite, centered on the video.
+
+    Args:
+        cues (List[Tuple[float, float, str]]): The start time, end time and text of each cue
+        font_path (str): The path to the font
+        size (int): The font size
+        color (str): The color of the subtitles
+        stroke_color (str): The outline color of the subtitles
+        stroke_width (int): The outline thickness of the subtitles
+
+    Returns:
+        clips (List[ImageClip]): The subtitle clips
+    """
+    clips = []
+    for start, end, text in cues:
+        sprite = render_subtitle(text, font_path, size, color, stroke_color, stroke_width)
+        mask = ImageClip(sprite[:, :, 3] / 255.0, ismask=True)
+        clip = ImageClip(sprite[:, :, :3]).set_mask(mask)
+        clips.append(clip.set_start(start).set_end(end).set_position(("center", "center")))
+
+    return clips
+
+
+def build_timeline(images_count: int, duration: float) -> List[Tuple[int, float]]:
+    """
+    Shows the images in turn, over and over, until the duration of the audio has been reached.
+
+    Args:
+        images_count (int): The amount of images
+        duration (float): The duration of the audio
+
+    Returns:
+        timeline (List[Tuple[int, float]]): The index of the image and its display duration, in order
+    """
+    req_dur = duration / images_count
+
+    timeline = []
+    tot_dur = 0
+    while tot_dur < duration:
+        for index in range(images_count):
+            timeline.append((index, req_dur))
+            tot_dur += req_dur
+
+    return timeline
+
+
+def generate_video(images, tts_path, subtitles_path, font, subtitles_max_chars, subtitles_size, subtitles_color, subtitles_stroke_color, subtitles_stroke_thickness, audio_volume, output_path: str = None, backend: str = "moviepy", chunks: int = 1) -> str:
     """
     Combines everything into the final video.
 
@@ -56,71 +163,78 @@ def generate_video(images, tts_path, subtitles_path, font, subtitles_max_chars,
         subtitles_stroke_color (str): The stroke color of the subtitles
         subtitles_stroke_thickness (int): The stroke thickness of the subtitles
         audio_volume (float): The volume of the audio
+        output_path (str, optional): The path of the MP4 file, a new file in `temp` if omitted
+        backend (str): The render backend, `moviepy` or `ffmpeg`
+        chunks (int): The amount of segments rendered in parallel, the whole video is rendered at once if 1
 
     Returns:
         path (str): The path to the generated MP4 File.
     """
-    combined_image_path = os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".mp4")
+    combined_image_path = output_path or os.path.join(ROOT_DIR, "temp", str(uuid4()) + ".mp4")
     threads = get_threads()
-    tts_clip = AudioFileClip(tts_path)
-    max_duration = tts_clip.duration
-    req_dur = max_duration / len(images)
-
-    # Make a generator that returns a TextClip when called with consecutive
-    generator = lambda txt: TextClip(
-        txt,
-        font=os.path.join(get_fonts_dir(), font),
-        fontsize=subtitles_size,
-        color=subtitles_color,
-        stroke_color=subtitles_stroke_color,
-        stroke_width=subtitles_stroke_thickness,
-        size=(1080, 1920),
-        method="caption",
-    )
+    start = time.perf_counter()
 
-    clips = []
-    tot_dur = 0
-    # Add downloaded clips over and over until the duration of the audio (max_duration) has been reached
-    while tot_dur < max_duration:
-        for image_path in images:
-            clip = ImageClip(image_path)
-            clip.duration = req_dur
-            clip = clip.set_fps(30)
-
-            # Not all images are same size,
-            # so we need to resize them
-            if round((clip.w / clip.h), 4) < 0.5625:
-                if get_verbose():
-                    info(f" => Resizing Image: {image_path} to 1080x1920")
-                clip = crop(clip, width=clip.w, height=round(clip.w / 0.5625), \
-                            x_center=clip.w / 2, \
-                            y_center=clip.h / 2)
-            else:
-                if get_verbose():
-                    info(f" => Resizing Image: {image_path} to 1920x1080")
-                clip = crop(clip, width=round(0.5625 * clip.h), height=clip.h, \
-                            x_center=clip.w / 2, \
-                            y_center=clip.h / 2)
-            clip = clip.resize((1080, 1920))
-
-            # FX (Fade In)
-            # clip = clip.fadein(2)
-
-            clips.append(clip)
-            tot_dur += clip.duration
+    # Decode, crop and resize every image once, the timeline reuses the frames
+    frames = [prepare_image(image_path) for image_path in images]
 
-    final_clip = concatenate_videoclips(clips)
-    final_clip = final_clip.set_fps(30)
     random_song = choose_random_song()
 
     # Equalize srt file
     equalize_subtitles(subtitles_path, subtitles_max_chars)
+    cues = load_subtitles(subtitles_path)
+    font_path = os.path.join(get_fonts_dir(), font)
+    style = (font_path, subtitles_size, subtitles_color, subtitles_stroke_color, subtitles_stroke_thickness)
+
+    if backend not in ("ffmpeg", "moviepy"):
+        raise ValueError(f"Unknown render backend: {backend}")
+
+    with resource("encoder"):
+        if chunks > 1:
+            _render_chunked(backend, frames, cues, style, tts_path, random_song, audio_volume, combined_image_path,
+                            threads, chunks)
+        elif backend == "ffmpeg":
+            _render_with_ffmpeg(frames, cues, style, tts_path, random_song, audio_volume, combined_image_path,
+                                threads)
+        else:
+            _render_with_moviepy(frames, cues, style, tts_path, random_song, audio_volume, combined_image_path,
+                                 threads)
+
+    success(f"Wrote Video to \"{combined_image_path}\" with the {backend} backend "
+            f"({chunks} chunk{'s' if chunks > 1 else ''}) in {time.perf_counter() - start:.1f}s")
+
+    return combined_image_path
+
+
+def _render_with_moviepy(frames, cues, style, tts_path, song_path, audio_volume, output_path, threads) -> None:
+    """
+    Renders the video with MoviePy, every frame is composed in Python.
+
+    Args:
+        frames (List[np.ndarray]): The prepared frames of the images
+        cues (List[Tuple[float, float, str]]): The subtitle cues
+        style (tuple): The font path, size, color, stroke color and stroke thickness of the subtitles
+        tts_path (str): The path to the TTS file
+        song_path (str): The path to the background song
+        audio_volume (float): The volume of the background song
+        output_path (str): The path of the MP4 file
+        threads (int): The amount of threads used by the encoder
+
+    Returns:
+        None
+    """
+    tts_clip = AudioFileClip(tts_path)
+    max_duration = tts_clip.duration
+
+    image_clips = [ImageClip(frame).set_fps(30) for frame in frames]
+    clips = [image_clips[index].set_duration(duration) for index, duration in build_timeline(len(frames), max_duration)]
+
+    final_clip = concatenate_videoclips(clips)
+    final_clip = final_clip.set_fps(30)
 
     # Burn the subtitles into the video
-    subtitles = SubtitlesClip(subtitles_path, generator)
+    subtitles = subtitle_clips(cues, *style)
 
-    subtitles.set_pos(("center", "center"))
-    random_song_clip = AudioFileClip(random_song).set_fps(44300)
+    random_song_clip = AudioFileClip(song_path).set_fps(44300)
 
     # Turn down volume
     random_song_clip = random_song_clip.fx(afx.volumex, audio_volume)
@@ -132,14 +246,183 @@ def generate_video(images, tts_path, subtitles_path, font, subtitles_max_chars,
     final_clip = final_clip.set_audio(comp_audio)
     final_clip = final_clip.set_duration(tts_clip.duration)
 
-    # Add subtitles
-    final_clip = CompositeVideoClip([
-        final_clip,
-        subtitles
-    ])
+    # Add subtitles, each one is only blended over its own region while it is displayed
+    final_clip = CompositeVideoClip([final_clip] + subtitles)
 
-    final_clip.write_videofile(combined_image_path, threads=threads)
+    final_clip.write_videofile(output_path, threads=threads)
 
-    success(f"Wrote Video to \"{combined_image_path}\"")
 
-    return combined_image_path
+def _write_render_inputs(frames, cues, style, work_dir) -> Tuple[List[str], List[Tuple[str, float, float]]]:
+    """
+    Writes the prepared frames and the subtitle sprites as PNG files, each distinct subtitle is written once.
+
+    Args:
+        frames (List[np.ndarray]): The prepared frames of the images
+        cues (List[Tuple[float, float, str]]): The subtitle cues
+        style (tuple): The font path, size, color, stroke color and stroke thickness of the subtitles
+        work_dir (str): The folder to write the files to
+
+    Returns:
+        frame_paths (List[str]): The path of each frame
+        overlays (List[Tuple[str, float, float]]): The sprite path, start and end time of each cue
+    """
+    frame_paths = []
+    for i, frame in enumerate(frames):
+        frame_path = os.path.join(work_dir, f"frame_{i}.png")
+        Image.fromarray(frame).save(frame_path)
+        frame_paths.append(frame_path)
+
+    overlays = []
+    sprite_paths = {}
+    for start, end, text in cues:
+        if text not in sprite_paths:
+            sprite_paths[text] = os.path.join(work_dir, f"subtitle_{len(sprite_paths)}.png")
+            Image.fromarray(render_subtitle(text, *style)).save(sprite_paths[text])
+        overlays.append((sprite_paths[text], start, end))
+
+    return frame_paths, overlays
+
+
+def _render_with_ffmpeg(frames, cues, style, tts_path, song_path, audio_volume, output_path, threads) -> None:
+    """
+    Renders the video in a single FFmpeg pass, from the prepared frames and subtitle sprites written as PNG files.
+
+    Args:
+        frames (List[np.ndarray]): The prepared frames of the images
+        cues (List[Tuple[float, float, str]]): The subtitle cues
+        style (tuple): The font path, size, color, stroke color and stroke thickness of the subtitles
+        tts_path (str): The path to the TTS file
+        song_path (str): The path to the background song
+        audio_volume (float): The volume of the background song
+        output_path (str): The path of the MP4 file
+        threads (int): The amount of threads used by the encoder
+
+    Returns:
+        None
+    """
+    work_dir = os.path.splitext(output_path)[0] + "_render"
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        frame_paths, overlays = _write_render_inputs(frames, cues, style, work_dir)
+
+        duration = get_audio_duration(tts_path)
+        timeline = [(frame_paths[index], req_dur) for index, req_dur in build_timeline(len(frames), duration)]
+
+        render_with_ffmpeg(timeline, overlays, tts_path, song_path, audio_volume, duration, output_path, threads)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def split_timeline(timeline: List[Tuple[int, float]], duration: float, chunks: int) -> List[List[Tuple[int, float, float]]]:
+    """
+    Splits the timeline at image boundaries into consecutive segments of about the same amount of images.
+
+    Args:
+        timeline (List[Tuple[int, float]]): The index of the image and its display duration, in order
+        duration (float): The duration of the video, the timeline is cut there
+        chunks (int): The maximum amount of segments
+
+    Returns:
+        segments (List[List[Tuple[int, float, float]]]): The index, start time and display duration of the
+            images of each segment
+    """
+    entries = []
+    tot_dur = 0
+    for index, req_dur in timeline:
+        if tot_dur >= duration:
+            break
+        entries.append((index, tot_dur, min(req_dur, duration - tot_dur)))
+        tot_dur += req_dur
+
+    chunks = max(1, min(chunks, len(entries)))
+    size, extra = divmod(len(entries), chunks)
+
+    segments = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        segments.append(entries[start:end])
+        start = end
+
+    return segments
+
+
+def _render_segment(spec) -> str:
+    """
+    Renders one silent segment of a chunked render, runs in a worker process.
+
+    Args:
+        spec (tuple): The backend, image timeline, subtitle overlays, duration, output path and threads of the segment
+
+    Returns:
+        path (str): The path of the segment
+    """
+    backend, timeline, overlays, duration, output_path, threads = spec
+
+    if backend == "ffmpeg":
+        return render_video_segment(timeline, overlays, duration, output_path, threads)
+
+    clips = [ImageClip(image_path).set_duration(req_dur) for image_path, req_dur in timeline]
+    video_clip = concatenate_videoclips(clips).set_fps(30)
+    subtitles = [ImageClip(sprite_path).set_start(start).set_end(end).set_position(("center", "center"))
+                 for sprite_path, start, end in overlays]
+
+    final_clip = CompositeVideoClip([video_clip] + subtitles).set_duration(duration)
+    final_clip.write_videofile(output_path, fps=30, codec="libx264", preset="medium", audio=False,
+                               threads=threads, logger=None)
+
+    return output_path
+
+
+def _render_chunked(backend, frames, cues, style, tts_path, song_path, audio_volume, output_path, threads,
+                    chunks) -> None:
+    """
+    Renders segments of the video in parallel worker processes, joins them without re-encoding and muxes the
+    audio once at the end.
+
+    Args:
+        backend (str): The backend rendering each segment, `moviepy` or `ffmpeg`
+        frames (List[np.ndarray]): The prepared frames of the images
+        cues (List[Tuple[float, float, str]]): The subtitle cues
+        style (tuple): The font path, size, color, stroke color and stroke thickness of the subtitles
+        tts_path (str): The path to the TTS file
+        song_path (str): The path to the background song
+        audio_volume (float): The volume of the background song
+        output_path (str): The path of the MP4 file
+        threads (int): The amount of threads shared by the encoders
+        chunks (int): The amount of segments rendered in parallel
+
+    Returns:
+        None
+    """
+    work_dir = os.path.splitext(output_path)[0] + "_render"
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        frame_paths, overlays = _write_render_inputs(frames, cues, style, work_dir)
+        duration = get_audio_duration(tts_path)
+        segments = split_timeline(build_timeline(len(frames), duration), duration, chunks)
+
+        specs = []
+        for i, segment in enumerate(segments):
+            # Cut on frame boundaries so that the segments add up to the full duration
+            segment_start = round(segment[0][1] * FPS) / FPS
+            segment_end = duration if i == len(segments) - 1 else round((segment[-1][1] + segment[-1][2]) * FPS) / FPS
+
+            segment_overlays = [(sprite_path, max(start, segment_start) - segment_start,
+                                 min(end, segment_end) - segment_start)
+                                for sprite_path, start, end in overlays if start < segment_end and end > segment_start]
+
+            specs.append((backend, [(frame_paths[index], req_dur) for index, _, req_dur in segment], segment_overlays,
+                          segment_end - segment_start, os.path.join(work_dir, f"segment_{i}.mp4"),
+                          max(1, threads // len(segments))))
+
+        # Spawned workers do not inherit the locks held by the threads of the pipeline
+        with ProcessPoolExecutor(max_workers=len(specs), mp_context=multiprocessing.get_context("spawn")) as executor:
+            segment_paths = list(executor.map(_render_segment, specs))
+
+        silent_path = concat_segments(segment_paths, os.path.join(work_dir, "silent.mp4"))
+        mux_audio(silent_path, tts_path, song_path, audio_volume, duration, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,17 +1,36 @@
+import re
 import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Optional
 
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.firefox.service import Service
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.firefox import GeckoDriverManager
 
+from src.utils.metrics import record_timing
 from utils.config import *
 from utils.constants import *
 from utils.status import *
 from utils.utils import build_url
 
 
+@lru_cache(maxsize=None)
+def get_geckodriver_path() -> str:
+    """
+    Gets the path to geckodriver, downloading it if needed. It is resolved once per process.
+
+    Returns:
+        path (str): The path to the geckodriver binary.
+    """
+    return GeckoDriverManager().install()
+
+
 def init_browser(firefox_profile_path: str) -> webdriver.Firefox:
     """
     Initializes the web browser.
@@ -34,76 +53,174 @@ def init_browser(firefox_profile_path: str) -> webdriver.Firefox:
     options.add_argument(firefox_profile_path)
 
     # Set the service
-    service: Service = Service(GeckoDriverManager().install())
+    service: Service = Service(get_geckodriver_path())
 
     # Initialize the browser
     browser: webdriver.Firefox = webdriver.Firefox(service=service, options=options)
     return browser
 
 
-def get_channel_id(browser) -> str:
+# Maximum duration of each upload step in seconds, unless overridden by `upload_timeouts` in the config
+DEFAULT_UPLOAD_TIMEOUTS = {
+    "page": 30,
+    "details": 30,
+    "next": 15,
+    "upload": 900,
+    "done": 60,
+    "dialog_video_id": 10,
+    "video_id": 30
+}
+
+# Channel ID of each Firefox profile, a profile stays logged in to the same channel
+_channel_ids: Dict[str, str] = {}
+
+
+class UploadSteps:
+    """
+    Runs the steps of an upload, each with its own timeout, and records how long each step took.
+    """
+
+    def __init__(self, browser: webdriver.Firefox) -> None:
+        self._browser = browser
+        self._timeouts = {**DEFAULT_UPLOAD_TIMEOUTS, **get_settings().upload_timeouts}
+        self._verbose = get_verbose()
+
+    @contextmanager
+    def step(self, name: str):
+        """
+        Times a step, waits inside the step fail once its timeout is reached.
+
+        Args:
+            name (str): The name of the step, one of the keys of `DEFAULT_UPLOAD_TIMEOUTS`.
+
+        Returns:
+            wait (WebDriverWait): Waits for the conditions of the step.
+        """
+        timeout = self._timeouts[name]
+        start = time.perf_counter()
+        try:
+            yield WebDriverWait(self._browser, timeout)
+        except TimeoutException as e:
+            raise TimeoutError(f"Upload step \"{name}\" timed out after {timeout} seconds") from e
+        finally:
+            elapsed = time.perf_counter() - start
+            record_timing(f"upload {name}", elapsed)
+            if self._verbose:
+                info(f"\t=> Step \"{name}\" took {elapsed:.1f}s")
+
+
+def upload_finished(browser: webdriver.Firefox) -> bool:
+    """
+    Checks if the video file has been sent, the progress label shows a percentage until then.
+
+    Args:
+        browser (webdriver.Firefox): The web browser, on the upload dialog.
+
+    Returns:
+        finished (bool): True once the upload is complete.
+    """
+    labels = browser.find_elements(By.CSS_SELECTOR, YOUTUBE_UPLOAD_PROGRESS_CSS)
+    return bool(labels) and labels[0].text.strip() != "" and "%" not in labels[0].text
+
+
+def extract_video_id(href: str) -> Optional[str]:
+    """
+    Extracts the ID of a video from a link to it (youtu.be, Shorts, watch or Studio link).
+
+    Args:
+        href (str): The link to the video.
+
+    Returns:
+        video_id (str): The ID of the video, None if the link is not a link to a video.
+    """
+    match = re.search(r"(?:youtu\.be/|/shorts/|/video/|[?&]v=)([\w-]{11})", href)
+    return match.group(1) if match else None
+
+
+def dialog_video_id(browser: webdriver.Firefox) -> Optional[str]:
+    """
+    Gets the ID of the uploaded video from the link shown in the upload dialog.
+
+    Args:
+        browser (webdriver.Firefox): The web browser, on the upload dialog.
+
+    Returns:
+        video_id (str): The ID of the video, None until the link is shown.
+    """
+    for link in browser.find_elements(By.CSS_SELECTOR, YOUTUBE_VIDEO_LINK_CSS):
+        video_id = extract_video_id(link.get_attribute("href") or link.text)
+        if video_id:
+            return video_id
+
+    return None
+
+
+def get_channel_id(browser, firefox_profile: Optional[str] = None) -> str:
     """
     Gets the Channel ID of the YouTube Account.
 
     Args:
         browser (webdriver.Firefox): The web browser.
+        firefox_profile (str, optional): The profile of the browser, its Channel ID is looked up once if set.
 
     Returns:
         channel_id (str): The Channel ID.
     """
+    if firefox_profile in _channel_ids:
+        return _channel_ids[firefox_profile]
+
     driver = browser
     driver.get("https://studio.youtube.com")
-    time.sleep(2)
-    channel_id = driver.current_url.split("/")[-1]
+    # Studio redirects to the page of the channel
+    with UploadSteps(driver).step("page") as wait:
+        wait.until(EC.url_contains("/channel/"))
+    channel_id = driver.current_url.rstrip("/").split("/channel/")[-1].split("/")[0]
+    if firefox_profile is not None:
+        _channel_ids[firefox_profile] = channel_id
     return channel_id
 
 
-def upload_video(browser, video_path, title, description, is_for_kids) -> str:
+def upload_video(browser, video_path, title, description, is_for_kids, firefox_profile: Optional[str] = None) -> str:
     """
-    Uploads the video to YouTube.
+    Uploads the video to YouTube. The browser is left open to be reused, errors are raised.
+
+    Each step waits for the page to be ready instead of sleeping, and fails after its timeout.
 
     Args:
         browser (webdriver.Firefox): The web browser.
         video_path (str): The path to the video file.
         title (str): The title of the video.
         description (str): The description of the video.
+        is_for_kids (bool): Whether the video is made for kids.
+        firefox_profile (str, optional): The profile of the browser, used to cache its Channel ID.
 
     Returns:
         url (str): The URL of the uploaded video.
     """
-    try:
+    # limit title and description characters
+    title = title[:100]
+    description = description[:300]
 
-        # limit title and description characters
-        title = title[:100]
-        description = description[:300]
-
-        driver = browser
-        verbose = get_verbose()
-
-        # Go to youtube.com/upload
-        driver.get("https://www.youtube.com/upload")
+    driver = browser
+    verbose = get_verbose()
+    steps = UploadSteps(driver)
 
-        # Set video file
-        FILE_PICKER_TAG = "ytcp-uploads-file-picker"
-        file_picker = driver.find_element(By.TAG_NAME, FILE_PICKER_TAG)
-        INPUT_TAG = "input"
-        file_input = file_picker.find_element(By.TAG_NAME, INPUT_TAG)
-        file_input.send_keys(video_path)
+    # Go to youtube.com/upload
+    driver.get("https://www.youtube.com/upload")
 
-        # Wait for upload to finish
-        time.sleep(5)
+    # Set video file
+    with steps.step("page") as wait:
+        file_input = wait.until(EC.presence_of_element_located(
+            (By.CSS_SELECTOR, f"{YOUTUBE_FILE_PICKER_TAG} input")))
+    file_input.send_keys(video_path)
 
+    with steps.step("details") as wait:
         # Set title
-        textboxes = driver.find_elements(By.ID, YOUTUBE_TEXTBOX_ID)
-
-        title_el = textboxes[0]
-        description_el = textboxes[-1]
-
         if verbose:
             info("\t=> Setting title...")
 
+        title_el = wait.until(EC.element_to_be_clickable((By.ID, YOUTUBE_TEXTBOX_ID)))
         title_el.click()
-        time.sleep(1)
         title_el.clear()
         title_el.send_keys(title)
 
@@ -111,96 +228,84 @@ def upload_video(browser, video_path, title, description, is_for_kids) -> str:
             info("\t=> Setting description...")
 
         try:
-            # Set description
-            time.sleep(5)
+            # Set description, the last textbox of the dialog
+            wait.until(lambda d: len(d.find_elements(By.ID, YOUTUBE_TEXTBOX_ID)) > 1)
+            description_el = driver.find_elements(By.ID, YOUTUBE_TEXTBOX_ID)[-1]
+            wait.until(EC.element_to_be_clickable(description_el))
             description_el.click()
-            time.sleep(0.5)
             description_el.clear()
             description_el.send_keys(description)
-        except:
+        except TimeoutException:
             warning("Description not clickable, skipping...")
             # sometimes the description is not clickable dunno why at this point
 
-        time.sleep(0.5)
-
         # Set `made for kids` option
         if verbose:
             info("\t=> Setting `made for kids` option...")
 
-        is_for_kids_checkbox = driver.find_element(By.NAME, YOUTUBE_MADE_FOR_KIDS_NAME)
-        is_not_for_kids_checkbox = driver.find_element(By.NAME, YOUTUBE_NOT_MADE_FOR_KIDS_NAME)
-
-        if not is_for_kids:
-            is_not_for_kids_checkbox.click()
-        else:
-            is_for_kids_checkbox.click()
-
-        time.sleep(0.5)
+        kids_name = YOUTUBE_MADE_FOR_KIDS_NAME if is_for_kids else YOUTUBE_NOT_MADE_FOR_KIDS_NAME
+        wait.until(EC.element_to_be_clickable((By.NAME, kids_name))).click()
 
-        # Click next
+    # Click next until the visibility page
+    for _ in range(3):
         if verbose:
             info("\t=> Clicking next...")
 
-        next_button = driver.find_element(By.ID, YOUTUBE_NEXT_BUTTON_ID)
-        next_button.click()
+        with steps.step("next") as wait:
+            wait.until(EC.element_to_be_clickable((By.ID, YOUTUBE_NEXT_BUTTON_ID))).click()
 
-        # Click next again
-        if verbose:
-            info("\t=> Clicking next again...")
-        next_button = driver.find_element(By.ID, YOUTUBE_NEXT_BUTTON_ID)
-        next_button.click()
-
-        # Wait for 2 seconds
-        time.sleep(2)
-
-        # Click next again
-        if verbose:
-            info("\t=> Clicking next again...")
-        next_button = driver.find_element(By.ID, YOUTUBE_NEXT_BUTTON_ID)
-        next_button.click()
+    # Set as public
+    if verbose:
+        info("\t=> Setting as public...")
 
-        # Set as unlisted
-        if verbose:
-            info("\t=> Setting as public...")
+    with steps.step("next") as wait:
+        radio_buttons = wait.until(lambda d: d.find_elements(By.XPATH, YOUTUBE_RADIO_BUTTON_XPATH)[2:])
+        wait.until(EC.element_to_be_clickable(radio_buttons[0])).click()
 
-        radio_button = driver.find_elements(By.XPATH, YOUTUBE_RADIO_BUTTON_XPATH)
-        radio_button[2].click()
+    # Leaving the dialog before the file is sent would cancel the upload
+    if verbose:
+        info("\t=> Waiting for the upload to finish...")
 
-        if verbose:
-            info("\t=> Clicking done button...")
+    with steps.step("upload") as wait:
+        wait.until(upload_finished)
 
-        # Click done button
-        done_button = driver.find_element(By.ID, YOUTUBE_DONE_BUTTON_ID)
+    # The dialog shows the link of the video, which is unambiguous even if other uploads happen meanwhile
+    try:
+        with steps.step("dialog_video_id") as wait:
+            video_id = wait.until(dialog_video_id)
+    except TimeoutError:
+        warning("Video link not found in the upload dialog, it will be taken from the videos list.")
+        video_id = None
+
+    if verbose:
+        info("\t=> Clicking done button...")
+
+    # Click done button, the dialog closes once the video is published
+    with steps.step("done") as wait:
+        done_button = wait.until(EC.element_to_be_clickable((By.ID, YOUTUBE_DONE_BUTTON_ID)))
         done_button.click()
+        wait.until(EC.invisibility_of_element(done_button))
 
-        # Wait for 2 seconds
-        time.sleep(2)
-
-        # Get latest video
+    if video_id is None:
+        # Get the latest uploaded video URL
         if verbose:
             info("\t=> Getting video URL...")
 
-        # Get the latest uploaded video URL
-        driver.get(f"https://studio.youtube.com/channel/{get_channel_id(browser)}/videos/short")
-        time.sleep(2)
-        videos = driver.find_elements(By.TAG_NAME, "ytcp-video-row")
-        first_video = videos[0]
-        anchor_tag = first_video.find_element(By.TAG_NAME, "a")
-        href = anchor_tag.get_attribute("href")
+        driver.get(f"https://studio.youtube.com/channel/{get_channel_id(browser, firefox_profile)}/videos/short")
+        with steps.step("video_id") as wait:
+            anchor_tag = wait.until(EC.presence_of_element_located(
+                (By.CSS_SELECTOR, f"{YOUTUBE_VIDEO_ROW_TAG} a")))
+            href = anchor_tag.get_attribute("href")
         if verbose:
             info(f"\t=> Extracting video ID from URL: {href}")
-        video_id = href.split("/")[-2]
+        video_id = extract_video_id(href)
+        if video_id is None:
+            raise ValueError(f"No video ID in the link of the latest video: {href}")
 
-        # Build URL
-        url = build_url(video_id)
-
-        if verbose:
-            success(f" => Uploaded Video: {url}")
+    # Build URL
+    url = build_url(video_id)
 
-        # Close the browser
-        driver.quit()
+    if verbose:
+        success(f" => Uploaded Video: {url}")
 
-        return url
-    except:
-        browser.quit()
-        return ""
+    return url